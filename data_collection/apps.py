@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+
+
+def start_job_workers(sender, **kwargs):
+    """进程处理第一个请求时启动后台任务线程(之后直接返回)
+    不在导入时启动：gunicorn --preload等先导入再fork的部署中，线程必须在各子进程中启动。
+    """
+    from .views import JobStore
+    JobStore.start_workers()
 
 
 class DataCollectionConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "data_collection"
+
+    def ready(self):
+        request_started.connect(start_job_workers, dispatch_uid='data_collection.start_job_workers')
@@ -0,0 +1,154 @@
+"""
+压缩包解压辅助函数
+
+本模块会被解压进程池的子进程导入，因此不能依赖Django（spawn方式启动的子进程
+没有加载settings），只使用标准库；.tar.zst/.tar.lz4 需要可选依赖 zstandard/lz4，未安装时只影响这两种格式。
+"""
+
+import os
+import re
+import shutil
+import tarfile
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# 嗅探格式需要的文件头长度(tar的ustar标志位于偏移257处)
+SNIFF_SIZE = 512
+TAR_FORMATS = ('tar', 'tar.zst', 'tar.lz4')
+COPY_BUFSIZE = 1024 * 1024
+
+
+def plan_member_batches(infos, batch_bytes):
+    """将ZIP条目划分为若干批次，供进程池并行解压
+    大文件单独成批，小文件按解压后大小累积到batch_bytes为一批；
+    批次按大小降序排列，使大文件尽早开始，整体耗时更均衡。
+    """
+    batches = []
+    small_batch, small_bytes = [], 0
+    for info in sorted(infos, key=lambda i: i.file_size, reverse=True):
+        if info.file_size >= batch_bytes:
+            batches.append(([info.filename], info.file_size))
+            continue
+        small_batch.append(info.filename)
+        small_bytes += info.file_size
+        if small_bytes >= batch_bytes:
+            batches.append((small_batch, small_bytes))
+            small_batch, small_bytes = [], 0
+    if small_batch:
+        batches.append((small_batch, small_bytes))
+    return [names for names, _ in batches]
+
+
+def extract_zip_members(zip_path, extract_path, names):
+    """在子进程中解压指定条目，返回解压的条目数
+    每个子进程独立打开ZIP文件；zipfile在读完条目时会校验CRC，不匹配时抛出BadZipFile。
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zipf:
+        for name in names:
+            zipf.extract(name, extract_path)
+    return len(names)
+
+
+def sniff_archive_format(head):
+    """根据文件头判断压缩包格式：zip / tar / tar.zst / tar.lz4，无法识别时返回None"""
+    if head[:4] in (b'PK\x03\x04', b'PK\x05\x06'):
+        return 'zip'
+    if head[:4] == b'\x28\xb5\x2f\xfd':
+        return 'tar.zst'
+    if head[:4] == b'\x04\x22\x4d\x18':
+        return 'tar.lz4'
+    if head[257:262] == b'ustar':
+        return 'tar'
+    return None
+
+
+def read_head(stream, size=SNIFF_SIZE):
+    """从流中读取至多size字节用于嗅探(流可能一次返回不足size字节)"""
+    chunks, remaining = [], size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        chunks.append(data)
+        remaining -= len(data)
+    return b''.join(chunks)
+
+
+class PrefixedStream:
+    """把已读出的文件头放回流的前面，并统计从底层流读取的字节数"""
+
+    def __init__(self, head, stream):
+        self.head = head
+        self.stream = stream
+        self.bytes_read = len(head)
+
+    def read(self, size=-1):
+        if self.head:
+            if size is None or size < 0:
+                rest = self.stream.read()
+                self.bytes_read += len(rest)
+                data, self.head = self.head + rest, b''
+                return data
+            data, self.head = self.head[:size], self.head[size:]
+            return data
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def safe_member_path(extract_path, name):
+    """与zipfile.extract一致：去掉绝对路径、盘符以及 . / .. 路径段，结果为空时返回None"""
+    name = name.replace('\\', '/')
+    parts = [p for p in name.split('/') if p not in ('', '.', '..')]
+    if parts and re.fullmatch(r'[A-Za-z]:', parts[0]):
+        parts = parts[1:]
+    if not parts:
+        return None
+    return os.path.join(extract_path, *parts)
+
+
+def _decompressed_stream(stream, fmt):
+    """按格式包装解压流，tar格式直接返回原始流"""
+    if fmt == 'tar.zst':
+        if zstandard is None:
+            raise ValueError('解压 .tar.zst 需要安装 zstandard')
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    if fmt == 'tar.lz4':
+        if lz4_frame is None:
+            raise ValueError('解压 .tar.lz4 需要安装 lz4')
+        return lz4_frame.LZ4FrameFile(stream, mode='rb')
+    return stream
+
+
+def extract_tar_stream(stream, extract_path, fmt='tar'):
+    """顺序读取tar(可带zstd/lz4压缩)并解压到extract_path，返回解压的文件数
+    以流模式(r|)读取，不需要随机访问，可直接作用于网络数据流；
+    只解压普通文件和目录，符号链接/设备文件等条目被忽略，成员路径按safe_member_path处理。
+    """
+    os.makedirs(extract_path, exist_ok=True)
+    file_count = 0
+    with tarfile.open(fileobj=_decompressed_stream(stream, fmt), mode='r|') as tar:
+        for member in tar:
+            target = safe_member_path(extract_path, member.name)
+            if target is None:
+                continue
+            if member.isdir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if not member.isfile():
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            source = tar.extractfile(member)
+            with open(target, 'wb') as out:
+                shutil.copyfileobj(source, out, COPY_BUFSIZE)
+            file_count += 1
+    return file_count
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.7 on 2026-10-17 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data_collection", "0008_taskinfo_exported"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "job_id",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="任务ID"
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("extraction", "解压"), ("export", "导出")],
+                        max_length=20,
+                        verbose_name="任务类型",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        default="queued", max_length=20, verbose_name="任务状态"
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict, verbose_name="任务参数")),
+                ("result", models.JSONField(default=dict, verbose_name="任务结果")),
+                ("progress", models.IntegerField(default=0, verbose_name="进度")),
+                (
+                    "message",
+                    models.CharField(
+                        blank=True, default="", max_length=500, verbose_name="状态信息"
+                    ),
+                ),
+                (
+                    "error_message",
+                    models.TextField(blank=True, default="", verbose_name="错误信息"),
+                ),
+                (
+                    "size_bytes",
+                    models.BigIntegerField(default=0, verbose_name="数据大小"),
+                ),
+                (
+                    "worker_id",
+                    models.CharField(
+                        blank=True, default="", max_length=200, verbose_name="工作进程"
+                    ),
+                ),
+                (
+                    "heartbeat_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="心跳时间"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新时间"),
+                ),
+                (
+                    "completed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="完成时间"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "后台任务",
+                "verbose_name_plural": "后台任务",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "status", "created_at"],
+                        name="data_collec_kind_514a50_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data_collection", "0009_jobrecord"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobrecord",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("extraction", "解压"),
+                    ("export", "导出"),
+                    ("reservation", "容量预留"),
+                ],
+                max_length=20,
+                verbose_name="任务类型",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data_collection", "0010_jobrecord_reservation_kind"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="taskinfo",
+            name="exported_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="导出时间"),
+        ),
+        migrations.AddField(
+            model_name="taskinfo",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True,
+                default=django.utils.timezone.now,
+                verbose_name="更新时间",
+            ),
+            preserve_default=False,
+        ),
+    ]
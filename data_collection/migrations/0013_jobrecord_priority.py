@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data_collection", "0012_jobrecord_verification_kind"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobrecord",
+            name="priority",
+            field=models.IntegerField(default=0, verbose_name="优先级"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("data_collection", "0013_jobrecord_priority"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobrecord",
+            name="dedupe_key",
+            field=models.CharField(
+                blank=True, max_length=64, null=True, verbose_name="去重键"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="jobrecord",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("status__in", ["queued", "preparing", "processing"])
+                ),
+                fields=("dedupe_key",),
+                name="unique_active_dedupe_key",
+            ),
+        ),
+    ]
@@ -60,6 +60,9 @@ class TaskInfo(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
     recording_end_time = models.DateTimeField(null=True, blank=True, verbose_name="录制结束时间")
     exported = models.BooleanField(default=False, verbose_name="是否已导出")
+    # 最近一次导出的时间；updated_at晚于该时间说明导出后数据有变化，增量导出时会重新导出
+    exported_at = models.DateTimeField(null=True, blank=True, verbose_name="导出时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
     class Meta:
         verbose_name = "任务信息"
@@ -181,3 +184,52 @@ class ObjectData(models.Model):
 
     def __str__(self):
         return f"ObjectData for {self.episode_id}"
+
+
+class JobRecord(models.Model):
+    """后台任务记录：解压/导出任务状态持久化到数据库，供多个工作进程共享与认领"""
+
+    KIND_CHOICES = [
+        ('extraction', '解压'),
+        ('export', '导出'),
+        ('reservation', '容量预留'),
+        ('verification', '导出校验'),
+    ]
+
+    job_id = models.CharField(max_length=100, unique=True, verbose_name="任务ID")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="任务类型")
+    status = models.CharField(max_length=20, default='queued', verbose_name="任务状态")
+    payload = models.JSONField(default=dict, verbose_name="任务参数")
+    result = models.JSONField(default=dict, verbose_name="任务结果")
+    progress = models.IntegerField(default=0, verbose_name="进度")
+    message = models.CharField(max_length=500, blank=True, default="", verbose_name="状态信息")
+    error_message = models.TextField(blank=True, default="", verbose_name="错误信息")
+    size_bytes = models.BigIntegerField(default=0, verbose_name="数据大小")
+    # 排队任务按优先级从高到低、同优先级按创建顺序认领
+    priority = models.IntegerField(default=0, verbose_name="优先级")
+    # 导出参数的摘要：同一时刻只允许一个参数相同的导出任务处于排队/执行中，由数据库唯一约束保证
+    dedupe_key = models.CharField(max_length=64, null=True, blank=True, verbose_name="去重键")
+    # 认领该任务的工作进程(主机名:进程号)，及其最近一次心跳时间
+    worker_id = models.CharField(max_length=200, blank=True, default="", verbose_name="工作进程")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="心跳时间")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+
+    class Meta:
+        verbose_name = "后台任务"
+        verbose_name_plural = "后台任务"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['kind', 'status', 'created_at']),
+        ]
+        constraints = [
+            # 部分唯一索引(SQLite/PostgreSQL)：任务结束或进入取消后不再占用去重键
+            models.UniqueConstraint(
+                fields=['dedupe_key'], condition=models.Q(status__in=['queued', 'preparing', 'processing']),
+                name='unique_active_dedupe_key'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.job_id}({self.status})"
@@ -103,6 +103,20 @@ class TaskInfoSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at',)
 
 
+class TaskInfoBundleSerializer(TaskInfoSerializer):
+    """episode数据包序列化器：在任务信息之外内嵌完整的采集者信息
+    各模态记录需由视图预先批量查询并挂到对应属性上(observations、skeleton_data等)，未挂载的模态输出null。
+    """
+    collector_info = CollectorSerializer(source='collector', read_only=True)
+    observations = ObservationsSerializer(read_only=True, allow_null=True, default=None)
+    parameters = ParametersSerializer(read_only=True, allow_null=True, default=None)
+    skeleton_data = SkeletonDataSerializer(read_only=True, allow_null=True, default=None)
+    kinematic_data = KinematicDataSerializer(read_only=True, allow_null=True, default=None)
+    imu_data = IMUDataSerializer(read_only=True, allow_null=True, default=None)
+    tactile_feedback = TactileFeedbackSerializer(read_only=True, allow_null=True, default=None)
+    object_data = ObjectDataSerializer(read_only=True, allow_null=True, default=None)
+
+
 class TaskInfoCreateSerializer(serializers.ModelSerializer):
     """任务信息创建序列化器（不包含关联数据）"""
     class Meta:
@@ -113,6 +127,18 @@ class TaskInfoCreateSerializer(serializers.ModelSerializer):
         ]
 
 
+class TaskInfoBulkCreateSerializer(serializers.ModelSerializer):
+    """批量创建任务信息的单条序列化器：采集者以ID给出，由视图统一批量校验，避免逐条查询"""
+    collector_id = serializers.IntegerField()
+
+    class Meta:
+        model = TaskInfo
+        fields = [
+            'collector_id', 'task_id', 'task_name', 'task_name_cn', 'init_scene_text',
+            'action_config', 'task_status', 'completed_at', 'recording_end_time'
+        ]
+
+
 class CollectorCreateUpdateSerializer(serializers.ModelSerializer):
     """采集者创建/更新序列化器"""
     class Meta:
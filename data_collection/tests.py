@@ -1,3 +1,328 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from .extraction import zstandard
+from .models import Collector, TaskInfo, JobRecord
+from .views import JobStore, FileUploadViewSet, ExportViewSet
+
+
+def make_zip(files):
+    """按 {成员名: 内容} 生成zip压缩包的字节"""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+def make_tar(files):
+    """按 {成员名: 内容} 生成tar压缩包的字节"""
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode='w') as t:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            t.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+class ServerTestCase(APITestCase):
+    """上传目录与导出目录放在临时目录下；不启动后台工作线程，需要执行的任务由测试直接运行"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.upload_dir = os.path.join(self.tmp, 'uploads')
+        os.makedirs(self.upload_dir)
+        override = override_settings(BASE_DIR=self.tmp, FILE_UPLOAD_DIR=self.upload_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        for target, name in ((JobStore, 'start_workers'), (JobStore, 'ensure_maintenance_started'),
+                             (FileUploadViewSet, '_ensure_thread_started'),
+                             (ExportViewSet, '_ensure_scheduler_started')):
+            patcher = mock.patch.object(target, name)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_episode(self, task_id, episode_id, files):
+        """创建TaskInfo及其上传目录 uploads/pick_<task_id>_<episode_id>"""
+        collector, _ = Collector.objects.get_or_create(
+            collector_id='c1', defaults={'username': 'u1', 'collector_organization': 'o', 'collector_name': 'n'}
+        )
+        task = TaskInfo.objects.create(collector=collector, task_id=task_id, episode_id=episode_id, task_name='pick')
+        root = os.path.join(self.upload_dir, f'pick_{task_id}_{episode_id}')
+        for name, data in files.items():
+            path = os.path.join(root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+        return task
+
+    def run_export(self, **data):
+        """提交导出任务并在当前线程中执行，返回任务记录"""
+        response = self.client.post('/api/export/export_all/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        record = JobStore.claim_next('export', 'preparing')
+        self.assertEqual(record.job_id, response.json()['export_id'])
+        ExportViewSet()._run_export(record)
+        record.refresh_from_db()
+        return record
+
+
+class ChunkedUploadTests(ServerTestCase):
+    """分块断点续传协议"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_zip({'video/a.mp4': os.urandom(5000)})
+        response = self.client.post('/api/files/upload_session/', {
+            'auth_token': 'tok', 'filename': 'pick_7_1_upload_1_ab.zip', 'total_size': len(self.data)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.session_id = response.json()['session_id']
+
+    def put_chunk(self, offset, data, token='tok'):
+        return self.client.put(
+            f'/api/files/upload_chunk/?session_id={self.session_id}&offset={offset}&auth_token={token}',
+            data, content_type='application/octet-stream'
+        )
+
+    def finalize(self, token='tok'):
+        return self.client.post('/api/files/upload_finalize/',
+                                {'session_id': self.session_id, 'auth_token': token}, format='json')
+
+    def test_token_mismatch(self):
+        self.assertEqual(self.put_chunk(0, self.data, token='other').status_code, 403)
+        response = self.client.put(f'/api/files/upload_chunk/?session_id={self.session_id}&offset=0',
+                                   self.data, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 401)
+
+    def test_out_of_order_chunk(self):
+        self.assertEqual(self.put_chunk(0, self.data[:1000]).json()['received'], 1000)
+        response = self.put_chunk(2000, self.data[2000:3000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['received'], 1000)
+        # 重传已接收的部分覆盖写入，再续传剩余部分
+        self.assertEqual(self.put_chunk(500, self.data[500:1000]).json()['received'], 1000)
+        self.assertTrue(self.put_chunk(1000, self.data[1000:]).json()['complete'])
+
+    def test_finalize_incomplete(self):
+        self.put_chunk(0, self.data[:10])
+        self.assertEqual(self.finalize().status_code, 409)
+
+    def test_idempotent_finalize(self):
+        self.put_chunk(0, self.data)
+        first = self.finalize()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()['upload_id'], self.session_id)
+        second = self.finalize()
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.json()['duplicate'])
+        # 完成后的重复请求同样校验令牌
+        self.assertEqual(self.finalize(token='other').status_code, 403)
+        self.assertEqual(JobRecord.objects.filter(kind='extraction', job_id=self.session_id).count(), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.upload_dir, f'{self.session_id}.zip')))
+        # 会话占用的容量已释放
+        self.assertFalse(JobRecord.objects.filter(kind='reservation', status='session').exists())
+
+
+class AdmissionTests(ServerTestCase):
+    """上传准入：队列满返回429，磁盘空间不足返回503，被拒绝的请求不留下占用记录"""
+
+    def create_session(self):
+        return self.client.post('/api/files/upload_session/',
+                                {'auth_token': 'tok', 'filename': 'a.zip', 'total_size': 100}, format='json')
+
+    def test_queue_full(self):
+        with mock.patch.object(FileUploadViewSet, '_max_queue_depth', 0):
+            response = self.create_session()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertFalse(JobRecord.objects.filter(kind='reservation').exists())
+
+    def test_pending_bytes_limit(self):
+        with mock.patch.object(FileUploadViewSet, '_max_pending_bytes', 150):
+            self.assertEqual(self.create_session().status_code, 201)
+            self.assertEqual(self.create_session().status_code, 429)
+
+    def test_disk_full(self):
+        with mock.patch.object(FileUploadViewSet, '_min_free_bytes', 10 ** 18):
+            response = self.create_session()
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(JobRecord.objects.filter(kind='reservation').exists())
+
+
+class StreamUploadTests(ServerTestCase):
+    """流式上传边接收边解压"""
+
+    def upload_stream(self, data, filename):
+        return self.client.post(f'/api/files/upload_stream/?auth_token=tok&filename={filename}',
+                                data, content_type='application/octet-stream')
+
+    def assertExtracted(self, response, files):
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(body['status'], 'completed')
+        self.assertEqual(body['extract_path'], os.path.join(self.upload_dir, 'pick_7_1'))
+        for name, data in files.items():
+            with open(os.path.join(body['extract_path'], name), 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(JobRecord.objects.get(job_id=body['upload_id']).status, 'completed')
+
+    def test_zip(self):
+        files = {'video/a.mp4': os.urandom(300000), 'IMU/left.csv': b'1,2\n' * 1000}
+        self.assertExtracted(self.upload_stream(make_zip(files), 'pick_7_1_upload_1_ab.zip'), files)
+
+    @skipUnless(zstandard, 'zstandard未安装')
+    def test_tar_zst(self):
+        files = {'video/a.mp4': os.urandom(300000), 'parameters/p.json': b'{}'}
+        data = zstandard.ZstdCompressor().compress(make_tar(files))
+        self.assertExtracted(self.upload_stream(data, 'pick_7_1_upload_1_ab.tar.zst'), files)
+
+    def test_corrupt_archive(self):
+        data = make_zip({'video/a.mp4': os.urandom(300000)})
+        response = self.upload_stream(data[:len(data) // 2], 'pick_7_1_upload_1_ab.zip')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(JobRecord.objects.get(job_id=response.json()['upload_id']).status, 'failed')
+        # 本任务创建的解压目录已删除
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, 'pick_7_1')))
+
+
+class PathTraversalTests(ServerTestCase):
+    """客户端给出的文件名、压缩包成员名和下载路径都不能逃出所在目录"""
+
+    def test_stream_filename(self):
+        victim = os.path.join(self.tmp, 'victim')
+        os.makedirs(victim)
+        response = self.client.post('/api/files/upload_stream/?auth_token=tok&filename=../victim_upload_1_ab.zip',
+                                    make_zip({'a.txt': b'x'}), content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(os.path.isdir(victim))
+        self.assertFalse(JobRecord.objects.filter(kind='extraction').exists())
+
+    def test_session_filename(self):
+        response = self.client.post('/api/files/upload_session/',
+                                    {'auth_token': 'tok', 'filename': '../../x.zip', 'total_size': 10}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_archive_members(self):
+        data = make_zip({'../evil.txt': b'e', 'video/a.mp4': b'v'})
+        response = self.client.post('/api/files/upload_stream/?auth_token=tok&filename=pick_7_1_upload_1_ab.zip',
+                                    data, content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'evil.txt')))
+        self.assertFalse(os.path.exists(os.path.join(self.upload_dir, 'evil.txt')))
+
+    def test_download_file(self):
+        export_path = os.path.join(self.tmp, 'export_output', 'E')
+        os.makedirs(export_path)
+        for params in ({'export_path': export_path, 'file_path': '../../uploads/x'},
+                       {'export_path': '/etc', 'file_path': 'passwd'}):
+            self.assertIn(self.client.get('/api/export/download_file/', params).status_code, (403, 404))
+
+
+class ExportTests(ServerTestCase):
+    """导出任务"""
+
+    def test_incremental_export_marks_exported(self):
+        first = self.make_episode('7', '1', {'video/cam.mp4': b'v' * 100})
+        record = self.run_export(mode='incremental')
+        self.assertEqual(record.status, 'completed')
+        self.assertEqual(record.progress, 100)
+        self.assertEqual(record.result['episode_count'], 1)
+        first.refresh_from_db()
+        self.assertTrue(first.exported)
+        self.assertIsNotNone(first.exported_at)
+
+        # 只导出尚未导出的episode
+        second = self.make_episode('7', '2', {'video/cam.mp4': b'w' * 100})
+        record = self.run_export(mode='incremental')
+        self.assertEqual(record.result['episode_count'], 1)
+        second.refresh_from_db()
+        self.assertTrue(second.exported)
+        record = self.run_export(mode='incremental')
+        self.assertEqual(record.result['episode_count'], 0)
+
+    def test_duplicate_export(self):
+        first = self.client.post('/api/export/export_all/', {'mode': 'full'}, format='json').json()
+        second = self.client.post('/api/export/export_all/', {'mode': 'full'}, format='json').json()
+        self.assertTrue(second['duplicate'])
+        self.assertEqual(first['export_id'], second['export_id'])
+
+    def test_cancel_removes_output(self):
+        self.make_episode('7', '1', {'video/cam.mp4': b'v' * 100, 'skeleton/s.csv': b's' * 100})
+        response = self.client.post('/api/export/export_all/', {}, format='json')
+        export_id = response.json()['export_id']
+        record = JobStore.claim_next('export', 'preparing')
+        report = ExportViewSet._report_export_progress
+
+        def cancel_then_report(view, *args, **kwargs):
+            # 复制开始后(导出目录已创建)请求取消
+            self.client.post('/api/export/cancel/', {'export_id': export_id}, format='json')
+            return report(view, *args, **kwargs)
+
+        with mock.patch.object(ExportViewSet, '_report_export_progress', cancel_then_report):
+            ExportViewSet()._run_export(record)
+        record.refresh_from_db()
+        self.assertEqual(record.status, 'cancelled')
+        self.assertEqual(record.progress, 0)
+        self.assertEqual(os.listdir(os.path.join(self.tmp, 'export_output')), [])
+        # 被取消的episode不标记为已导出
+        self.assertFalse(TaskInfo.objects.get(episode_id='1').exported)
+
+
+class DownloadTests(ServerTestCase):
+    """导出文件下载：Range分段、后缀Range和条件请求"""
+
+    def setUp(self):
+        super().setUp()
+        self.export_path = os.path.join(self.tmp, 'export_output', 'E')
+        os.makedirs(os.path.join(self.export_path, 'v'))
+        self.data = os.urandom(100000)
+        with open(os.path.join(self.export_path, 'v', 'a.mp4'), 'wb') as f:
+            f.write(self.data)
+
+    def get(self, **headers):
+        response = self.client.get('/api/export/download_file/',
+                                   {'export_path': self.export_path, 'file_path': 'v/a.mp4'}, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(body, self.data[10:20])
+
+    def test_suffix_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {len(self.data) - 5}-{len(self.data) - 1}/{len(self.data)}')
+        self.assertEqual(body, self.data[-5:])
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(HTTP_RANGE=f'bytes={len(self.data)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_not_modified(self):
+        response, _ = self.get()
+        etag = response['ETag']
+        response, body = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b'')
+        response, _ = self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
@@ -1,27 +1,74 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import transaction, connection, close_old_connections, IntegrityError
+from django.db.models import Count, Sum, CharField, Q, F, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.lookups import LessThan
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
-from django.http import JsonResponse, HttpResponse
-from datetime import datetime
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, TemporaryFileUploadHandler
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, FileResponse
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.dateparse import parse_date, parse_datetime
+from urllib.parse import quote
+from django.utils import timezone
+from datetime import datetime, timedelta
 import os
+import socket
+import hashlib
+import hmac
 import zipfile
+import tarfile
 import threading
 import time
 import uuid
 import shutil
 import re
+import io
+import json
+import queue
+import struct
+import multiprocessing
+import math
+import zlib
+import errno
+import csv
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:  # 未安装pyarrow时元数据表改为CSV
+    pyarrow = None
+    pyarrow_parquet = None
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from .extraction import (
+    extract_zip_members, plan_member_batches, sniff_archive_format, read_head,
+    PrefixedStream, safe_member_path, extract_tar_stream, TAR_FORMATS
+)
 from .models import (
     Collector, TaskInfo, Observations, Parameters, 
-    SkeletonData, KinematicData, IMUData, TactileFeedback, ObjectData
+    SkeletonData, KinematicData, IMUData, TactileFeedback, ObjectData, JobRecord
 )
 from .serializers import (
     CollectorSerializer, CollectorCreateUpdateSerializer, CollectorCreateSerializer, CollectorLoginSerializer,
-    TaskInfoSerializer, TaskInfoCreateSerializer,
+    TaskInfoSerializer, TaskInfoCreateSerializer, TaskInfoBulkCreateSerializer, TaskInfoBundleSerializer,
     ObservationsSerializer, ParametersSerializer,
     SkeletonDataSerializer, KinematicDataSerializer,
     IMUDataSerializer, TactileFeedbackSerializer, ObjectDataSerializer
@@ -115,9 +162,16 @@ class CollectorViewSet(viewsets.ModelViewSet):
         return None
 
 
+class EpisodeBundlePagination(PageNumberPagination):
+    """episode数据包分页：可用page_size参数调整每页数量，上限500(每页的模态查询不需要再分块)"""
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 class TaskInfoViewSet(viewsets.ModelViewSet):
     """任务信息管理API"""
     queryset = TaskInfo.objects.all()
+    _max_bulk_episodes = 1000  # 批量创建接口单次最多episode数
     
     def get_serializer_class(self):
         if self.action in ['create']:
@@ -205,12 +259,72 @@ class TaskInfoViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(task)
         return Response(serializer.data)
     
+    # 数据包中的模态：(挂载到TaskInfo上的属性名, 模型, TaskInfo上回填的记录ID字段)
+    _BUNDLE_MODALITIES = (
+        ('observations', Observations, 'observations_id'),
+        ('parameters', Parameters, 'parameters_id'),
+        ('skeleton_data', SkeletonData, 'skeletonData_id'),
+        ('kinematic_data', KinematicData, 'kinematicData_id'),
+        ('imu_data', IMUData, 'imu_id'),
+        ('tactile_feedback', TactileFeedback, 'tactile_feedback_id'),
+        ('object_data', ObjectData, 'objectData_id'),
+    )
+    
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """分页返回episode数据包：TaskInfo及其采集者信息和各模态记录
+        参数: page, page_size(最大500), collector_id(采集者数据库ID), task_id, task_status
+        每页查询次数固定：计数1次 + TaskInfo联表采集者1次 + 每个模态表1次，与每页episode数无关。
+        数值参数不是正整数时返回400(page另可为'last')。
+        """
+        for name in ('collector_id', 'page', 'page_size'):
+            value = request.query_params.get(name)
+            if name == 'page' and value in EpisodeBundlePagination.last_page_strings:
+                continue
+            if value and not (value.isdigit() and int(value) > 0):
+                return Response({'error': f'{name} 必须是正整数: {value}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = TaskInfo.objects.select_related('collector').order_by('-created_at', '-id')
+        collector_id = request.query_params.get('collector_id')
+        if collector_id:
+            queryset = queryset.filter(collector_id=collector_id)
+        task_id = request.query_params.get('task_id')
+        if task_id:
+            queryset = queryset.filter(task_id=task_id)
+        task_status = request.query_params.get('task_status')
+        if task_status:
+            queryset = queryset.filter(task_status=task_status)
+        
+        paginator = EpisodeBundlePagination()
+        tasks = paginator.paginate_queryset(queryset, request, view=self)
+        self._attach_modalities(tasks)
+        serializer = TaskInfoBundleSerializer(tasks, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    def _attach_modalities(self, tasks):
+        """为一页TaskInfo批量查询各模态记录并挂到对应属性上，每个模态表一次查询
+        优先使用TaskInfo上回填的记录ID；尚未回填的episode按外键取最新一条记录。
+        """
+        task_pks = [task.pk for task in tasks]
+        for attr, model, id_field in self._BUNDLE_MODALITIES:
+            linked_ids = {getattr(task, id_field) for task in tasks if getattr(task, id_field)}
+            unlinked = [task.pk for task in tasks if not getattr(task, id_field)]
+            by_id, latest = {}, {}
+            if task_pks:
+                for record in model.objects.filter(Q(id__in=linked_ids) | Q(task_info_id__in=unlinked)).order_by('id'):
+                    by_id[record.id] = record
+                    latest[record.task_info_id] = record
+            for task in tasks:
+                record_id = getattr(task, id_field)
+                setattr(task, attr, by_id.get(record_id) if record_id else latest.get(task.pk))
+    
     def create_task_info(self, task_data):
         """创建任务信息 - 对应DBController.create_task_info"""
         print(f"[DEBUG] create_task_info 收到数据: {task_data}")
         serializer = TaskInfoCreateSerializer(data=task_data)
-        print(f"[DEBUG] 序列化器是否有效: {serializer.is_valid()}")
-        if not serializer.is_valid():
+        is_valid = serializer.is_valid()
+        print(f"[DEBUG] 序列化器是否有效: {is_valid}")
+        if not is_valid:
             print(f"[DEBUG] 序列化器错误: {serializer.errors}")
             return None
         
@@ -279,6 +393,61 @@ class TaskInfoViewSet(viewsets.ModelViewSet):
         print(f"[DEBUG] 创建任务失败")
         return Response({'error': '创建任务失败'}, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def save_full_episodes_bulk(self, request):
+        """批量保存episode（离线采集后的补录）
+        请求体: {"episodes": [{collector_id, task_id, task_name, init_scene_text, action_config, task_status}, ...]}
+        全部校验通过才写入；采集者一次查询校验，任务一次批量插入，episode_id一次UPDATE回填为自增ID。
+        """
+        episodes = request.data.get('episodes')
+        if not isinstance(episodes, list) or not episodes:
+            return Response({'error': '缺少episodes参数'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(episodes) > self._max_bulk_episodes:
+            return Response({'error': f'单次最多提交 {self._max_bulk_episodes} 个episode'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = TaskInfoBulkCreateSerializer(data=episodes, many=True)
+        if not serializer.is_valid():
+            return Response({'error': '数据校验失败', 'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data
+        
+        # 验证采集者是否存在(一次查询)
+        collector_ids = {item['collector_id'] for item in items}
+        existing = set(Collector.objects.filter(id__in=collector_ids).values_list('id', flat=True))
+        missing = sorted(collector_ids - existing)
+        if missing:
+            return Response({'error': f'采集者ID {missing} 不存在'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        task_ids = self._bulk_create_tasks(items)
+        print(f"[DEBUG] 批量创建任务 {len(task_ids)} 个")
+        return Response({
+            'created': len(task_ids),
+            'episodes': [{'task_id': tid, 'episode_id': tid} for tid in task_ids]
+        }, status=status.HTTP_201_CREATED)
+    
+    @staticmethod
+    def _bulk_create_tasks(items):
+        """批量插入TaskInfo并将episode_id设为自增ID，返回按输入顺序排列的ID列表。
+        插入时episode_id先用本批次唯一的占位值(满足唯一约束)，随后用一条
+        UPDATE ... SET episode_id = CAST(id AS CHAR) 整批回填，而不是逐条save。
+        ID由数据库分配，不会复用已删除episode的ID。
+        """
+        prefix = f"pending-{uuid.uuid4().hex}-"
+        tasks = [
+            TaskInfo(episode_id=f"{prefix}{i:06d}", **item)
+            for i, item in enumerate(items)
+        ]
+        pending = TaskInfo.objects.filter(episode_id__startswith=prefix)
+        with transaction.atomic():
+            TaskInfo.objects.bulk_create(tasks, batch_size=500)
+            if connection.features.can_return_rows_from_bulk_insert:
+                task_ids = [task.id for task in tasks]
+            else:
+                id_by_placeholder = dict(pending.values_list('episode_id', 'id'))
+                task_ids = [id_by_placeholder[task.episode_id] for task in tasks]
+            pending.update(episode_id=Cast('id', output_field=CharField()))
+        return task_ids
+    
     @action(detail=True, methods=['patch'])
     def update_status(self, request, pk=None):
         """更新任务状态"""
@@ -304,7 +473,9 @@ class TaskInfoViewSet(viewsets.ModelViewSet):
             # 回退为默认的detail pk对象
             task = self.get_object()
         task.exported = bool(exported)
-        task.save(update_fields=['exported'])
+        if task.exported:
+            task.exported_at = timezone.now()
+        task.save(update_fields=['exported', 'exported_at'])
         return Response({'message': 'updated', 'id': task.id, 'episode_id': task.episode_id, 'exported': task.exported})
     
     @action(detail=False, methods=['patch'])
@@ -559,58 +730,523 @@ class DataCollectionController:
         return self.create_task_info(task_data)
 
 
+class JobStore:
+    """后台任务状态存储
+    任务状态保存在 JobRecord 表中，任意工作进程都可以查询状态和认领任务。
+    认领采用无锁的比较并交换：UPDATE ... WHERE status='queued'，影响行数为1者认领成功。
+    每个进程有一个维护线程，定期为本进程持有的任务刷新心跳，并回收心跳超时(进程已退出)的任务。
+    """
+    HOSTNAME = socket.gethostname()
+    # 各类任务的"执行中"状态，心跳只对这些状态有意义
+    RUNNING_STATUSES = {
+        'extraction': ['extracting'],
+        'export': ['preparing', 'processing', 'cancelling'],
+        'verification': ['verifying'],
+        # 正在接收请求体的上传所占用的容量
+        'reservation': ['receiving'],
+    }
+    FINISHED_STATUSES = ['completed', 'failed', 'cancelled']
+
+    _maintenance_thread = None
+    _maintenance_lock = threading.Lock()
+
+    @classmethod
+    def worker_id(cls):
+        """当前进程的标识；每次按当前PID计算，fork出的子进程(如gunicorn --preload)各自持有自己的任务"""
+        return f"{cls.HOSTNAME}:{os.getpid()}"
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # fork只复制调用fork的线程：子进程中没有维护线程，继承的锁也可能处于持有状态
+        cls._maintenance_thread = None
+        cls._maintenance_lock = threading.Lock()
+
+    @classmethod
+    def create(cls, job_id, kind, payload=None, status='queued', size_bytes=0, message='', priority=0,
+               dedupe_key=None):
+        fields = {}
+        if status != 'queued':
+            # 直接以执行中状态创建的任务由当前进程持有
+            fields = {'worker_id': cls.worker_id(), 'heartbeat_at': timezone.now()}
+        return JobRecord.objects.create(
+            job_id=job_id, kind=kind, status=status, payload=payload or {},
+            size_bytes=size_bytes, message=message, priority=priority, dedupe_key=dedupe_key, **fields
+        )
+
+    @staticmethod
+    def get(job_id, kind=None):
+        queryset = JobRecord.objects.filter(job_id=job_id)
+        if kind:
+            queryset = queryset.filter(kind=kind)
+        return queryset.first()
+
+    @staticmethod
+    def update(job_id, only_if_status=None, **fields):
+        """更新任务字段；进入完成状态时自动写入completed_at
+        only_if_status不为空时只在当前状态属于其中时更新(比较并交换)，返回更新的行数。
+        """
+        now = timezone.now()
+        if fields.get('status') in JobStore.FINISHED_STATUSES:
+            fields.setdefault('completed_at', now)
+        queryset = JobRecord.objects.filter(job_id=job_id)
+        if only_if_status is not None:
+            queryset = queryset.filter(status__in=only_if_status)
+        return queryset.update(updated_at=now, **fields)
+
+    @classmethod
+    def claim(cls, job_id, status, queryset=None):
+        """认领排队中的任务并置为status，成功返回任务记录，已被其他进程认领则返回None"""
+        now = timezone.now()
+        if queryset is None:
+            queryset = JobRecord.objects.all()
+        claimed = queryset.filter(job_id=job_id, status='queued').update(
+            status=status, worker_id=cls.worker_id(), heartbeat_at=now, updated_at=now
+        )
+        return JobRecord.objects.get(job_id=job_id) if claimed else None
+
+    @classmethod
+    def claim_next(cls, kind, status, limit=None):
+        """按优先级(高者优先)和创建顺序认领下一个排队任务，没有可认领任务时返回None
+        limit不为空时，同类执行中的任务(所有进程合计)达到limit后不再认领，多个进程同时认领也不会超出上限：
+        SQLite写操作整库串行，执行中的任务数作为UPDATE的条件，计数与认领在同一条语句中完成；
+        其他数据库(PostgreSQL/MySQL)在事务中见_claim_next_locked。
+        """
+        if limit is not None and connection.vendor != 'sqlite':
+            return cls._claim_next_locked(kind, status, limit)
+        queryset = JobRecord.objects.all()
+        if limit is not None:
+            running = (JobRecord.objects.filter(kind=kind, status__in=cls.RUNNING_STATUSES[kind])
+                       .order_by().values('kind').annotate(n=Count('pk')).values('n'))
+            queryset = queryset.filter(LessThan(Coalesce(Subquery(running), 0), limit))
+        while True:
+            candidates = list(JobRecord.objects.filter(kind=kind, status='queued')
+                              .order_by('-priority', 'created_at').values_list('job_id', flat=True)[:10])
+            if not candidates:
+                return None
+            for job_id in candidates:
+                record = cls.claim(job_id, status, queryset)
+                if record is not None:
+                    return record
+            if limit is not None and cls.count(kind, cls.RUNNING_STATUSES[kind]) >= limit:
+                return None
+
+    @classmethod
+    def _claim_next_locked(cls, kind, status, limit):
+        """claim_next在PostgreSQL/MySQL上的实现：在事务中用SELECT ... FOR UPDATE锁住该类所有排队和执行中的任务，
+        同类认领因此串行执行，锁内计数再认领。
+        这些数据库上，带子查询计数的UPDATE不能保证上限：PostgreSQL的READ COMMITTED下并发语句
+        各自基于快照计数，MySQL则不允许UPDATE的子查询引用被更新的表(错误1093)。
+        """
+        with transaction.atomic():
+            rows = list(JobRecord.objects.select_for_update()
+                        .filter(kind=kind, status__in=['queued', *cls.RUNNING_STATUSES[kind]])
+                        .order_by('pk').values_list('job_id', 'status', 'priority', 'created_at'))
+            running = sum(1 for row in rows if row[1] != 'queued')
+            queued = sorted((row for row in rows if row[1] == 'queued'), key=lambda row: (-row[2], row[3]))
+            if running >= limit or not queued:
+                return None
+            return cls.claim(queued[0][0], status)
+
+    @staticmethod
+    def count(kind, statuses):
+        return JobRecord.objects.filter(kind=kind, status__in=statuses).count()
+
+    @classmethod
+    def ensure_maintenance_started(cls):
+        """确保本进程的心跳/回收线程已启动"""
+        if cls._maintenance_thread is not None:
+            return
+        with cls._maintenance_lock:
+            if cls._maintenance_thread is None:
+                cls._maintenance_thread = threading.Thread(
+                    target=cls._maintenance_loop, name='job-maintenance', daemon=True
+                )
+                cls._maintenance_thread.start()
+
+    @classmethod
+    def start_workers(cls):
+        """启动本进程的维护线程和解压、导出工作线程(已启动时直接返回)。
+        由apps中的request_started信号在进程处理第一个请求时调用，重启前排队或被回收重新排队的任务
+        不必等新的上传/导出请求即被认领；也可以在gunicorn的post_fork等钩子中直接调用。
+        """
+        cls.ensure_maintenance_started()
+        FileUploadViewSet._ensure_thread_started()
+        ExportViewSet._ensure_scheduler_started()
+
+    @classmethod
+    def _maintenance_loop(cls):
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
+        while True:
+            time.sleep(interval)
+            close_old_connections()
+            try:
+                cls.heartbeat()
+                cls.recover_stale()
+            except Exception as e:
+                print(f"[JobStore] 任务心跳/回收失败: {e}")
+
+    @classmethod
+    def heartbeat(cls):
+        """刷新本进程持有的所有执行中任务的心跳"""
+        running = [s for statuses in cls.RUNNING_STATUSES.values() for s in statuses]
+        JobRecord.objects.filter(worker_id=cls.worker_id(), status__in=running).update(heartbeat_at=timezone.now())
+
+    @classmethod
+    def recover_stale(cls):
+        """回收心跳超时的任务：压缩包仍在磁盘上的解压任务重新排队，没有压缩包(流式上传)的解压任务
+        和导出/校验任务标记失败，正在取消的导出任务直接标记为已取消"""
+        lease = getattr(settings, 'JOB_LEASE_SECONDS', 300)
+        deadline = timezone.now() - timedelta(seconds=lease)
+        stale = JobRecord.objects.filter(heartbeat_at__lt=deadline)
+        requeued = failed = 0
+        for record in stale.filter(kind='extraction', status__in=cls.RUNNING_STATUSES['extraction']):
+            # 比较并交换：其他进程的维护线程可能同时在回收同一个任务
+            queryset = stale.filter(pk=record.pk, status__in=cls.RUNNING_STATUSES['extraction'])
+            zip_path = record.payload.get('zip_path')
+            if zip_path and os.path.exists(zip_path):
+                # 记录重试次数，重新执行前先清空上次解压了一半的目录
+                payload = dict(record.payload, retries=record.payload.get('retries', 0) + 1)
+                requeued += queryset.update(status='queued', worker_id='', heartbeat_at=None, payload=payload,
+                                            updated_at=timezone.now())
+            elif queryset.update(status='failed', error_message='执行解压的工作进程已退出，且没有可重新解压的压缩包',
+                                 completed_at=timezone.now(), updated_at=timezone.now()):
+                # 流式上传边接收边解压，压缩包不落盘，只能删除本任务创建的解压目录，由客户端重新上传
+                failed += 1
+                FileUploadViewSet._remove_extract_path(record.payload)
+        # 接收中的进程已退出，释放其占用的上传容量
+        stale.filter(kind='reservation', status__in=cls.RUNNING_STATUSES['reservation']).update(
+            status='failed', completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        stale.filter(kind='export', status='cancelling').update(
+            status='cancelled', progress=0, completed_at=timezone.now(), updated_at=timezone.now()
+        )
+        for kind, error_message in (('export', '执行导出的工作进程已退出'), ('verification', '执行校验的工作进程已退出')):
+            failed += stale.filter(kind=kind, status__in=cls.RUNNING_STATUSES[kind]).update(
+                status='failed', error_message=error_message, completed_at=timezone.now(),
+                updated_at=timezone.now()
+            )
+        if requeued or failed:
+            print(f"[JobStore] 回收超时任务: 重新排队 {requeued} 个解压任务, 标记失败 {failed} 个任务")
+
+    @staticmethod
+    def isoformat(value):
+        return timezone.localtime(value).isoformat() if value else None
+
+
+class DiskUploadedFile(UploadedFile):
+    """已由 DirectToDiskUploadHandler 直接写入最终位置的上传文件，附带写入时计算的SHA-256"""
+
+    def __init__(self, path, name, content_type, size, charset, content_type_extra, sha256):
+        super().__init__(open(path, 'rb'), name, content_type, size, charset, content_type_extra)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class DirectToDiskUploadHandler(TemporaryFileUploadHandler):
+    """将指定表单字段的文件直接流式写入目标路径(大块缓冲写)，同时计算SHA-256与大小。
+    避免Django先落临时文件、视图再复制一遍造成的双倍磁盘写；其他文件字段仍走临时文件。
+    """
+
+    def __init__(self, request, field_name, target_path):
+        super().__init__(request)
+        self.chunk_size = getattr(settings, 'UPLOAD_WRITE_CHUNK_SIZE', 4 * 1024 * 1024)
+        self.target_field = field_name
+        self.target_path = target_path
+        self.target_taken = False
+        self.direct = False
+
+    def new_file(self, field_name, *args, **kwargs):
+        self.direct = field_name == self.target_field and not self.target_taken
+        if not self.direct:
+            return super().new_file(field_name, *args, **kwargs)
+        FileUploadHandler.new_file(self, field_name, *args, **kwargs)
+        self.target_taken = True
+        os.makedirs(os.path.dirname(self.target_path), exist_ok=True)
+        self.file = open(self.target_path, 'wb', buffering=self.chunk_size)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.direct:
+            return super().receive_data_chunk(raw_data, start)
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.direct:
+            return super().file_complete(file_size)
+        self.file.close()
+        self.direct = False
+        return DiskUploadedFile(
+            self.target_path, self.file_name, self.content_type, file_size,
+            self.charset, self.content_type_extra, self.hasher.hexdigest()
+        )
+
+    def upload_interrupted(self):
+        if not self.direct:
+            return super().upload_interrupted()
+        # 客户端中断时删除写了一半的文件
+        self.file.close()
+        try:
+            os.remove(self.target_path)
+        except FileNotFoundError:
+            pass
+
+
+class StreamingZipExtractor:
+    """边接收边解压的ZIP流解析器
+    按顺序解析ZIP本地文件头(local file header)，不依赖中央目录，
+    数据到达即解压写入目标目录；遇到中央目录即认为所有条目已处理完毕。
+    支持 STORED/DEFLATED 压缩方式、数据描述符(data descriptor)以及ZIP64扩展。
+    """
+    LOCAL_HEADER_SIG = b'PK\x03\x04'
+    CENTRAL_DIR_SIG = b'PK\x01\x02'
+    END_OF_CENTRAL_DIR_SIG = b'PK\x05\x06'
+    DATA_DESCRIPTOR_SIG = b'PK\x07\x08'
+    LOCAL_HEADER_STRUCT = struct.Struct('<4sHHHHHIIIHH')
+    READ_SIZE = 1024 * 1024
+
+    def __init__(self, stream, extract_path):
+        self.stream = stream
+        self.extract_path = extract_path
+        self.pending = b''
+        self.bytes_read = 0
+        self.file_count = 0
+
+    def _read(self, size):
+        """读取至多size字节，优先返回回退缓冲区中的数据"""
+        if self.pending:
+            data, self.pending = self.pending[:size], self.pending[size:]
+            return data
+        data = self.stream.read(min(size, self.READ_SIZE))
+        self.bytes_read += len(data)
+        return data
+
+    def _read_exact(self, size):
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            data = self._read(remaining)
+            if not data:
+                raise zipfile.BadZipFile('ZIP数据流意外结束')
+            chunks.append(data)
+            remaining -= len(data)
+        return b''.join(chunks)
+
+    def _safe_target(self, name):
+        return safe_member_path(self.extract_path, name)
+
+    @staticmethod
+    def _parse_zip64_extra(extra, usize, csize):
+        """从ZIP64扩展字段中取出真实的解压/压缩大小"""
+        pos = 0
+        while pos + 4 <= len(extra):
+            header_id, data_size = struct.unpack('<HH', extra[pos:pos + 4])
+            if header_id == 0x0001:
+                data = extra[pos + 4:pos + 4 + data_size]
+                values = [struct.unpack('<Q', data[i:i + 8])[0] for i in range(0, len(data) - 7, 8)]
+                if usize == 0xFFFFFFFF and values:
+                    usize = values.pop(0)
+                if csize == 0xFFFFFFFF and values:
+                    csize = values.pop(0)
+                return usize, csize, True
+            pos += 4 + data_size
+        return usize, csize, False
+
+    def extract(self):
+        """解析整个数据流，返回解压出的文件数"""
+        os.makedirs(self.extract_path, exist_ok=True)
+        while True:
+            signature = self._read(4)
+            if not signature:
+                break
+            if len(signature) < 4:
+                signature += self._read_exact(4 - len(signature))
+            if signature in (self.CENTRAL_DIR_SIG, self.END_OF_CENTRAL_DIR_SIG):
+                # 条目已全部处理，丢弃中央目录
+                while self._read(self.READ_SIZE):
+                    pass
+                break
+            if signature != self.LOCAL_HEADER_SIG:
+                raise zipfile.BadZipFile('无效的ZIP本地文件头')
+            self._extract_entry(signature + self._read_exact(self.LOCAL_HEADER_STRUCT.size - 4))
+        return self.file_count
+
+    def _extract_entry(self, header):
+        (_, _, flags, method, _, _, crc, csize, usize,
+         name_len, extra_len) = self.LOCAL_HEADER_STRUCT.unpack(header)
+        raw_name = self._read_exact(name_len)
+        extra = self._read_exact(extra_len)
+        name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+        usize, csize, zip64 = self._parse_zip64_extra(extra, usize, csize)
+        has_descriptor = bool(flags & 0x08)
+
+        if flags & 0x01:
+            raise zipfile.BadZipFile(f'不支持加密的ZIP条目: {name}')
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise zipfile.BadZipFile(f'不支持的压缩方式({method}): {name}')
+        if method == zipfile.ZIP_STORED and has_descriptor:
+            raise zipfile.BadZipFile(f'无法流式解析未知长度的STORED条目: {name}')
+
+        target = self._safe_target(name)
+        is_dir = name.endswith('/')
+        if target and is_dir:
+            os.makedirs(target, exist_ok=True)
+            target = None
+        out = None
+        if target:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            out = open(target, 'wb')
+
+        actual_crc = 0
+        try:
+            if method == zipfile.ZIP_STORED:
+                remaining = csize
+                while remaining > 0:
+                    data = self._read(min(remaining, self.READ_SIZE))
+                    if not data:
+                        raise zipfile.BadZipFile(f'ZIP数据流意外结束: {name}')
+                    remaining -= len(data)
+                    actual_crc = zlib.crc32(data, actual_crc)
+                    if out:
+                        out.write(data)
+            else:
+                decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                remaining = None if has_descriptor else csize
+                while not decompressor.eof:
+                    size = self.READ_SIZE if remaining is None else min(remaining, self.READ_SIZE)
+                    data = self._read(size) if size else b''
+                    if not data:
+                        raise zipfile.BadZipFile(f'ZIP数据流意外结束: {name}')
+                    if remaining is not None:
+                        remaining -= len(data)
+                    output = decompressor.decompress(data)
+                    actual_crc = zlib.crc32(output, actual_crc)
+                    if out:
+                        out.write(output)
+                # 未知长度时，解压器多读的数据属于下一个条目
+                self.pending = decompressor.unused_data + self.pending
+        finally:
+            if out:
+                out.close()
+
+        if has_descriptor:
+            descriptor = self._read_exact(4)
+            if descriptor == self.DATA_DESCRIPTOR_SIG:
+                descriptor = self._read_exact(4)
+            crc = struct.unpack('<I', descriptor)[0]
+            self._read_exact(16 if zip64 else 8)
+        if actual_crc != crc:
+            raise zipfile.BadZipFile(f'CRC校验失败: {name}')
+        if not is_dir:
+            self.file_count += 1
+
+
 class FileUploadViewSet(viewsets.ViewSet):
     """文件上传管理API"""
     
-    # 类级别的共享状态
-    _active_extractions = {}  # 存储活跃的解压任务
-    _extraction_queue = []     # 解压任务队列
-    _max_concurrent_extractions = 2  # 最大并发解压数
-    _running_extractions = 0  # 当前运行解压数
-    _extraction_thread = None  # 解压处理线程
+    # 类级别的共享状态（任务状态本身保存在JobRecord表中，这里只有本进程的调度状态）
+    _extraction_queue = queue.Queue()  # 本进程新建的解压任务ID(线程安全，阻塞获取)
+    _max_concurrent_extractions = getattr(settings, 'EXTRACTION_MAX_CONCURRENT', 2)  # 解压工作线程数
+    _running_extractions = 0  # 本进程当前运行解压数
+    _extraction_lock = threading.Lock()  # 保护上述计数器
+    _extraction_workers = []  # 解压工作线程
+    _process_pool = None  # 解压进程池(并行解压大文件)
+    _process_pool_lock = threading.Lock()
     _thread_started = False  # 线程启动标志
+    _upload_sessions_ttl = 24 * 3600  # 分块上传会话过期时间(秒)
+    _upload_chunk_size = 8 * 1024 * 1024  # 建议的分块大小
+    _session_locks = {}  # 每个上传会话一把锁，避免同一会话的分块并发写
+    _session_locks_guard = threading.Lock()
+    # 准入控制
+    _max_queue_depth = getattr(settings, 'UPLOAD_MAX_QUEUE_DEPTH', 50)  # 排队+解压中+有效预留的任务数上限
+    _max_pending_bytes = getattr(settings, 'UPLOAD_MAX_PENDING_BYTES', 100 * 1024 ** 3)  # 待解压字节数上限
+    _min_free_bytes = getattr(settings, 'UPLOAD_MIN_FREE_BYTES', 10 * 1024 ** 3)  # 上传目录剩余空间水位
+    _retry_after = getattr(settings, 'UPLOAD_RETRY_AFTER', 30)
+    _reservation_ttl = getattr(settings, 'UPLOAD_RESERVATION_TTL', 600)
+    
+    @classmethod
+    def _reset_after_fork(cls):
+        # 子进程中没有父进程的工作线程和解压进程池，重新初始化本进程的调度状态
+        cls._extraction_queue = queue.Queue()
+        cls._running_extractions = 0
+        cls._extraction_lock = threading.Lock()
+        cls._extraction_workers = []
+        cls._process_pool = None
+        cls._process_pool_lock = threading.Lock()
+        cls._thread_started = False
+        cls._session_locks = {}
+        cls._session_locks_guard = threading.Lock()
     
     @classmethod
     def _ensure_thread_started(cls):
-        """确保解压线程已启动"""
-        if not cls._thread_started:
-            cls._extraction_thread = threading.Thread(target=cls._process_extraction_queue, daemon=True)
-            cls._extraction_thread.start()
+        """确保解压工作线程池已启动"""
+        if cls._thread_started:
+            return
+        with cls._extraction_lock:
+            if cls._thread_started:
+                return
+            JobStore.ensure_maintenance_started()
+            for i in range(max(1, cls._max_concurrent_extractions)):
+                worker = threading.Thread(
+                    target=cls._extraction_worker, name=f"extraction-worker-{i}", daemon=True
+                )
+                worker.start()
+                cls._extraction_workers.append(worker)
             cls._thread_started = True
     
     @classmethod
-    def _process_extraction_queue(cls):
-        """处理解压队列"""
+    def _extraction_worker(cls):
+        """解压工作线程：阻塞等待本进程队列中的任务，无任务时不占用CPU。
+        等待超时(心跳间隔)时从数据库认领其他进程遗留或重启前未完成的排队任务。
+        """
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
         while True:
             try:
-                if cls._extraction_queue and cls._running_extractions < cls._max_concurrent_extractions:
-                    task = cls._extraction_queue.pop(0)
+                job_id = cls._extraction_queue.get(timeout=interval)
+            except queue.Empty:
+                job_id = None
+            close_old_connections()
+            try:
+                if job_id is None:
+                    record = JobStore.claim_next('extraction', 'extracting')
+                else:
+                    record = JobStore.claim(job_id, 'extracting')
+                if record is None:
+                    continue
+                with cls._extraction_lock:
                     cls._running_extractions += 1
-                    
-                    # 在新线程中执行解压任务
-                    extraction_thread = threading.Thread(target=cls._execute_extraction, args=(task,))
-                    extraction_thread.start()
-                
-                time.sleep(0.5)  # 避免CPU占用过高
+                try:
+                    cls._execute_extraction(record)
+                finally:
+                    with cls._extraction_lock:
+                        cls._running_extractions -= 1
             except Exception as e:
                 print(f"[FileUpload] 解压队列处理错误: {e}")
+            finally:
+                if job_id is not None:
+                    cls._extraction_queue.task_done()
     
     @classmethod
-    def _execute_extraction(cls, task):
-        """执行解压任务"""
+    def _execute_extraction(cls, record):
+        """执行解压任务(任务已被本进程认领)"""
+        upload_id = record.job_id
+        zip_path = record.payload['zip_path']
+        extract_path = record.payload['extract_path']
         try:
-            print(f"[FileUpload] 开始解压任务: {task['task_id']}")
-            task['status'] = 'extracting'
+            print(f"[FileUpload] 开始解压任务: {upload_id}")
             
-            # 解压文件
-            zip_path = task['zip_path']
-            extract_path = task['extract_path']
+            # 上次执行的进程中途退出时目录中可能留有解压了一半的文件；
+            # 只清空上次由本任务创建的目录，之前已存在的同名目录中的数据不动
+            if record.payload.get('retries') and cls._remove_extract_path(record.payload):
+                print(f"[FileUpload] 重新解压(第{record.payload['retries']}次重试)，清空解压目录: {extract_path}")
             
-            # 确保解压目录存在
-            os.makedirs(extract_path, exist_ok=True)
+            # 创建解压目录并记录是否由本任务创建
+            cls._prepare_extract_path(record)
             
-            with zipfile.ZipFile(zip_path, 'r') as zipf:
-                zipf.extractall(extract_path)
+            cls._extract_archive(zip_path, extract_path)
             
             print(f"[FileUpload] 解压完成: {extract_path}")
             
@@ -619,6 +1255,7 @@ class FileUploadViewSet(viewsets.ViewSet):
                 cls._generate_models_from_extracted_folder(extract_path)
             except Exception as gen_e:
                 print(f"[FileUpload] 生成数据模型记录失败: {gen_e}")
+            cls._record_source_checksums(extract_path)
             
             # 删除压缩包
             try:
@@ -627,25 +1264,115 @@ class FileUploadViewSet(viewsets.ViewSet):
             except Exception as e:
                 print(f"[FileUpload] 删除压缩包失败: {e}")
             
-            task['status'] = 'completed'
-            task['completed_at'] = datetime.now()
-            print(f"[FileUpload] 解压任务完成: {task['task_id']}")
+            JobStore.update(upload_id, status='completed', result={'extract_path': extract_path})
+            print(f"[FileUpload] 解压任务完成: {upload_id}")
             
         except Exception as e:
-            task['status'] = 'failed'
-            task['error_message'] = str(e)
-            task['completed_at'] = datetime.now()
-            print(f"[FileUpload] 解压任务失败: {task['task_id']}, 错误: {e}")
+            JobStore.update(upload_id, status='failed', error_message=str(e))
+            print(f"[FileUpload] 解压任务失败: {upload_id}, 错误: {e}")
             
             # 清理失败的任务文件
             try:
-                if os.path.exists(task['zip_path']):
-                    os.remove(task['zip_path'])
+                if os.path.exists(zip_path):
+                    os.remove(zip_path)
             except Exception as cleanup_e:
                 print(f"[FileUpload] 清理失败文件错误: {cleanup_e}")
+
+    @staticmethod
+    def _record_source_checksums(extract_path):
+        """解压完成后记录各文件的校验和(此时文件多半仍在页缓存中)，之后的链接导出不必再读源文件；
+        失败只影响导出时是否需要重新计算，不影响上传结果"""
+        try:
+            count = SourceChecksums.record(extract_path)
+            print(f"[FileUpload] 记录源文件校验和: {extract_path}, {count} 个文件")
+        except Exception as e:
+            print(f"[FileUpload] 记录源文件校验和失败: {e}")
+    
+    @classmethod
+    def _get_process_pool(cls):
+        """获取(必要时创建)解压进程池，所有解压任务共享，总并行度不超过配置的进程数"""
+        with cls._process_pool_lock:
+            if cls._process_pool is None:
+                workers = getattr(settings, 'EXTRACTION_PROCESS_WORKERS', 0) or os.cpu_count() or 1
+                # 服务进程是多线程的，使用spawn启动子进程，避免fork继承锁状态
+                cls._process_pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return cls._process_pool
+    
+    @classmethod
+    def _reset_process_pool(cls, pool):
+        with cls._process_pool_lock:
+            if cls._process_pool is pool:
+                cls._process_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    @classmethod
+    def _extract_archive(cls, archive_path, extract_path):
+        """按文件头嗅探格式后解压：tar/tar.zst/tar.lz4 顺序流式解压，其余按ZIP处理
+        上传文件统一保存为 <upload_id>.zip，扩展名不代表实际格式。
+        """
+        with open(archive_path, 'rb') as f:
+            fmt = sniff_archive_format(f.read(512))
+            if fmt in TAR_FORMATS:
+                f.seek(0)
+                print(f"[FileUpload] 解压{fmt}归档: {archive_path}")
+                extract_tar_stream(f, extract_path, fmt)
+                return
+        cls._extract_zip(archive_path, extract_path)
+    
+    @classmethod
+    def _extract_zip(cls, zip_path, extract_path):
+        """解压ZIP：条目较大较多时按中央目录拆分到进程池并行解压并校验CRC，否则单线程解压"""
+        workers = getattr(settings, 'EXTRACTION_PROCESS_WORKERS', 0) or os.cpu_count() or 1
+        min_bytes = getattr(settings, 'EXTRACTION_PARALLEL_MIN_BYTES', 64 * 1024 * 1024)
+        with zipfile.ZipFile(zip_path, 'r') as zipf:
+            infos = zipf.infolist()
+            total_bytes = sum(info.file_size for info in infos)
+            if workers <= 1 or len(infos) < 2 or total_bytes < min_bytes:
+                zipf.extractall(extract_path)
+                return
         
-        finally:
-            cls._running_extractions -= 1
+        # 先在本进程中建好所有目录：各子进程中zipfile.extract先判断目录是否存在再创建，
+        # 多个进程向同一目录写文件时会互相竞争而抛出FileExistsError
+        for info in infos:
+            target = safe_member_path(extract_path, info.filename)
+            if target is None:
+                continue
+            os.makedirs(target if info.is_dir() else os.path.dirname(target), exist_ok=True)
+        
+        batch_bytes = max(total_bytes // (workers * 4), 8 * 1024 * 1024)
+        batches = plan_member_batches(infos, batch_bytes)
+        pool = cls._get_process_pool()
+        futures = []
+        try:
+            futures = [pool.submit(extract_zip_members, zip_path, extract_path, names) for names in batches]
+            for future in futures:
+                future.result()
+        except BrokenProcessPool:
+            # 子进程异常退出(如被OOM杀掉)：重建进程池，本次退回单线程解压
+            print(f"[FileUpload] 解压进程池异常，退回单线程解压: {zip_path}")
+            cls._reset_process_pool(pool)
+            with zipfile.ZipFile(zip_path, 'r') as zipf:
+                zipf.extractall(extract_path)
+        except Exception:
+            # 某一批失败时取消尚未开始的批次，并等待正在执行的批次结束，
+            # 之后调用方清理解压目录时不会再有子进程写入
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            raise
+    
+    # TaskInfo链接字段 -> 对应的模态数据模型
+    _LINK_MODELS = [
+        ('observations_id', Observations),
+        ('parameters_id', Parameters),
+        ('skeletonData_id', SkeletonData),
+        ('kinematicData_id', KinematicData),
+        ('imu_id', IMUData),
+        ('tactile_feedback_id', TactileFeedback),
+        ('objectData_id', ObjectData),
+    ]
 
     @classmethod
     def _generate_models_from_extracted_folder(cls, extract_path: str):
@@ -658,142 +1385,148 @@ class FileUploadViewSet(viewsets.ViewSet):
         - 写入路径均为相对settings.FILE_UPLOAD_DIR的相对路径。
         - Observations.depth_path 暂为空。
         """
+        return cls._register_extracted_folders([extract_path])
+
+    @classmethod
+    def _register_extracted_folders(cls, extract_paths: list):
+        """批量登记多个已解压的episode目录，全部在一个事务中完成：
+        每个模态表一次bulk_create，TaskInfo只更新有变化的链接字段。返回登记的episode数。
+        """
+        folders = []
+        for extract_path in extract_paths:
+            folder_name = os.path.basename(extract_path.rstrip(os.sep))
+            # 解析 task_name, task_id, episode_id
+            task_name, external_task_id, episode_id = cls._parse_folder_triplet(folder_name)
+            if not (task_name and external_task_id and episode_id):
+                print(f"[FileUpload] 警告: 目录名不符合规范, 跳过写库: {folder_name}")
+                continue
+            folders.append((extract_path, external_task_id, episode_id))
+        if not folders:
+            return 0
+
+        tasks = cls._resolve_tasks_for_folders(folders)
+
+        # 先在内存中规划好每个episode要创建的记录，再统一写库
+        plans = {}
+        for extract_path, external_task_id, episode_id in folders:
+            task = tasks.get((external_task_id, episode_id))
+            if task is None:
+                print(f"[FileUpload] 警告: 未找到TaskInfo(episode_id={episode_id}, task_id={external_task_id}), 跳过写库")
+                continue
+            records = cls._plan_episode_records(extract_path, task)
+            if records:
+                # 同一TaskInfo对应多个目录时以最后一个为准
+                plans[task.pk] = (task, records)
+        if not plans:
+            return 0
+
+        with transaction.atomic():
+            for link_field, model in cls._LINK_MODELS:
+                objs = [records[link_field] for _, records in plans.values() if link_field in records]
+                if not objs:
+                    continue
+                if connection.features.can_return_rows_from_bulk_insert:
+                    model.objects.bulk_create(objs)
+                else:
+                    # 数据库不支持批量插入回填主键(如MySQL)时逐条插入
+                    for obj in objs:
+                        obj.save(force_insert=True)
+
+            # 回填 TaskInfo 链接字段：链接字段集合相同的任务合并为一次UPDATE
+            # (UPDATE/bulk_update不会自动刷新auto_now字段，updated_at需显式写入，增量导出依赖它)
+            now = timezone.now()
+            updates = {}
+            for task, records in plans.values():
+                for link_field, obj in records.items():
+                    setattr(task, link_field, obj.id)
+                task.updated_at = now
+                updates.setdefault(tuple(sorted(records)) + ('updated_at',), []).append(task)
+            for fields, group in updates.items():
+                if len(group) == 1:
+                    task = group[0]
+                    TaskInfo.objects.filter(pk=task.pk).update(**{f: getattr(task, f) for f in fields})
+                else:
+                    TaskInfo.objects.bulk_update(group, list(fields))
+        return len(plans)
+
+    @staticmethod
+    def _resolve_tasks_for_folders(folders: list):
+        """为目录查找TaskInfo(优先episode_id)，否则按task_id取最近的一条。
+        返回 {(task_id, episode_id): TaskInfo}，查询次数与目录数量无关。
+        """
+        by_episode = TaskInfo.objects.in_bulk({ep for _, _, ep in folders}, field_name='episode_id')
+        missing_task_ids = {tid for _, tid, ep in folders if ep not in by_episode}
+        latest_by_task_id = {}
+        if missing_task_ids:
+            for task in TaskInfo.objects.filter(task_id__in=missing_task_ids).order_by('task_id', '-id'):
+                latest_by_task_id.setdefault(task.task_id, task)
+        result = {}
+        for _, tid, ep in folders:
+            task = by_episode.get(ep) or latest_by_task_id.get(tid)
+            if task is not None:
+                result[(tid, ep)] = task
+        return result
+
+    @classmethod
+    def _plan_episode_records(cls, extract_path: str, task):
+        """根据episode目录内容构造(未保存的)各模态记录，返回 {TaskInfo链接字段: 模型实例}"""
         base_upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
-        folder_name = os.path.basename(extract_path.rstrip(os.sep))
-        # 解析 task_name, task_id, episode_id
-        task_name, external_task_id, episode_id = cls._parse_folder_triplet(folder_name)
-        if not (task_name and external_task_id and episode_id):
-            print(f"[FileUpload] 警告: 目录名不符合规范, 跳过写库: {folder_name}")
-            return
 
-        # 查找TaskInfo(优先episode_id)，否则尝试按task_id取最近的一条
-        task = None
-        try:
-            task = TaskInfo.objects.get(episode_id=episode_id)
-        except TaskInfo.DoesNotExist:
-            tasks = TaskInfo.objects.filter(task_id=external_task_id).order_by('-id')
-            if tasks.exists():
-                task = tasks.first()
-        if task is None:
-            print(f"[FileUpload] 警告: 未找到TaskInfo(episode_id={episode_id}, task_id={external_task_id}), 跳过写库")
-            return
+        def rel(path):
+            return cls._safe_relpath(path, base_upload_dir) if path else ""
 
         # 构建各子目录路径(大小写不敏感匹配)
         subdirs = cls._map_existing_subdirs(extract_path, [
             'IMU', 'kinematic', 'parameters', 'skeleton', 'Tactile', 'video', 'object'
         ])
+        # 一次遍历为各模态目录建立文件索引；kinematic只记录目录本身，无需遍历其中的帧文件
+        index = {name: cls._index_files(path) for name, path in subdirs.items() if name != 'kinematic'}
+        common = {'task_info': task, 'episode_id': task.episode_id}
+        records = {}
 
-        with transaction.atomic():
-            # Observations: video_path 取首个视频文件，depth_path 空
-            obs_id = None
-            video_file = cls._find_first_file_with_exts(subdirs.get('video'), ['.mp4', '.avi', '.mov', '.mkv'])
-            if video_file:
-                rel_video = cls._safe_relpath(video_file, base_upload_dir)
-                obs = Observations.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    video_path=rel_video,
-                    depth_path=""
-                )
-                obs_id = obs.id
-
-            # Parameters: 取首个参数文件
-            params_id = None
-            params_file = cls._find_first_file_with_exts(subdirs.get('parameters'), ['.json', '.yaml', '.yml', '.txt'])
-            if params_file:
-                rel_params = cls._safe_relpath(params_file, base_upload_dir)
-                params = Parameters.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    parameters_path=rel_params
-                )
-                params_id = params.id
-
-            # SkeletonData: 分别选取对应扩展名
-            skel_id = None
-            fbx = cls._find_first_file_with_exts(subdirs.get('skeleton'), ['.fbx'])
-            bvh = cls._find_first_file_with_exts(subdirs.get('skeleton'), ['.bvh'])
-            csv = cls._find_first_file_with_exts(subdirs.get('skeleton'), ['.csv'])
-            npy = cls._find_first_file_with_exts(subdirs.get('skeleton'), ['.npy'])
-            if any([fbx, bvh, csv, npy]):
-                skel = SkeletonData.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    fbx_path=cls._safe_relpath(fbx, base_upload_dir) if fbx else "",
-                    bvh_path=cls._safe_relpath(bvh, base_upload_dir) if bvh else "",
-                    csv_path=cls._safe_relpath(csv, base_upload_dir) if csv else "",
-                    npy_path=cls._safe_relpath(npy, base_upload_dir) if npy else "",
-                )
-                skel_id = skel.id
-
-            # KinematicData: 记录目录本身(相对路径)
-            kine_id = None
-            if subdirs.get('kinematic') and os.path.isdir(subdirs['kinematic']):
-                rel_kine = cls._safe_relpath(subdirs['kinematic'], base_upload_dir)
-                kine = KinematicData.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    path=rel_kine
-                )
-                kine_id = kine.id
-
-            # IMUData: left/right 优先匹配, 否则取前两个
-            imu_id = None
-            left_imu, right_imu = cls._pick_left_right_files(subdirs.get('IMU'))
-            if left_imu or right_imu:
-                imu = IMUData.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    leftHandIMU_path=cls._safe_relpath(left_imu, base_upload_dir) if left_imu else "",
-                    rightHandIMU_path=cls._safe_relpath(right_imu, base_upload_dir) if right_imu else "",
-                )
-                imu_id = imu.id
-
-            # TactileFeedback: left/right 优先匹配
-            tac_id = None
-            left_tac, right_tac = cls._pick_left_right_files(subdirs.get('Tactile'))
-            if left_tac or right_tac:
-                tac = TactileFeedback.objects.create(
-                    task_info=task,
-                    episode_id=task.episode_id,
-                    leftHandTac_path=cls._safe_relpath(left_tac, base_upload_dir) if left_tac else "",
-                    rightHandTac_path=cls._safe_relpath(right_tac, base_upload_dir) if right_tac else "",
-                )
-                tac_id = tac.id
-
-            # 回填 TaskInfo 链接字段
-            updated = False
-            if obs_id is not None:
-                task.observations_id = obs_id; updated = True
-            if params_id is not None:
-                task.parameters_id = params_id; updated = True
-            if skel_id is not None:
-                task.skeletonData_id = skel_id; updated = True
-            if kine_id is not None:
-                task.kinematicData_id = kine_id; updated = True
-            if imu_id is not None:
-                task.imu_id = imu_id; updated = True
-            if tac_id is not None:
-                task.tactile_feedback_id = tac_id; updated = True
-            
-            # ObjectData: 记录 fbx/cmb 文件路径
-            obj_id = None
-            obj_dir = subdirs.get('object')
-            if obj_dir and os.path.isdir(obj_dir):
-                obj_fbx = cls._find_first_file_with_exts(obj_dir, ['.fbx'])
-                obj_cmb = cls._find_first_file_with_exts(obj_dir, ['.cmb'])
-                if obj_fbx or obj_cmb:
-                    obj = ObjectData.objects.create(
-                        task_info=task,
-                        episode_id=task.episode_id,
-                        fbx_path=cls._safe_relpath(obj_fbx, base_upload_dir) if obj_fbx else "",
-                        cmb_path=cls._safe_relpath(obj_cmb, base_upload_dir) if obj_cmb else "",
-                    )
-                    obj_id = obj.id
-            if obj_id is not None:
-                task.objectData_id = obj_id; updated = True
-            if updated:
-                task.save()
+        # Observations: video_path 取首个视频文件，depth_path 空
+        video_file = cls._first_indexed_file(index['video'], ['.mp4', '.avi', '.mov', '.mkv'])
+        if video_file:
+            records['observations_id'] = Observations(video_path=rel(video_file), depth_path="", **common)
+
+        # Parameters: 取首个参数文件
+        params_file = cls._first_indexed_file(index['parameters'], ['.json', '.yaml', '.yml', '.txt'])
+        if params_file:
+            records['parameters_id'] = Parameters(parameters_path=rel(params_file), **common)
+
+        # SkeletonData: 分别选取对应扩展名
+        fbx = cls._first_indexed_file(index['skeleton'], ['.fbx'])
+        bvh = cls._first_indexed_file(index['skeleton'], ['.bvh'])
+        csv = cls._first_indexed_file(index['skeleton'], ['.csv'])
+        npy = cls._first_indexed_file(index['skeleton'], ['.npy'])
+        if any([fbx, bvh, csv, npy]):
+            records['skeletonData_id'] = SkeletonData(
+                fbx_path=rel(fbx), bvh_path=rel(bvh), csv_path=rel(csv), npy_path=rel(npy), **common
+            )
+
+        # KinematicData: 记录目录本身(相对路径)
+        if subdirs.get('kinematic') and os.path.isdir(subdirs['kinematic']):
+            records['kinematicData_id'] = KinematicData(path=rel(subdirs['kinematic']), **common)
+
+        # IMUData: left/right 优先匹配, 否则取前两个
+        left_imu, right_imu = cls._pick_left_right_files(index['IMU'])
+        if left_imu or right_imu:
+            records['imu_id'] = IMUData(leftHandIMU_path=rel(left_imu), rightHandIMU_path=rel(right_imu), **common)
+
+        # TactileFeedback: left/right 优先匹配
+        left_tac, right_tac = cls._pick_left_right_files(index['Tactile'])
+        if left_tac or right_tac:
+            records['tactile_feedback_id'] = TactileFeedback(
+                leftHandTac_path=rel(left_tac), rightHandTac_path=rel(right_tac), **common
+            )
+
+        # ObjectData: 记录 fbx/cmb 文件路径
+        obj_fbx = cls._first_indexed_file(index['object'], ['.fbx'])
+        obj_cmb = cls._first_indexed_file(index['object'], ['.cmb'])
+        if obj_fbx or obj_cmb:
+            records['objectData_id'] = ObjectData(fbx_path=rel(obj_fbx), cmb_path=rel(obj_cmb), **common)
+
+        return records
 
     @staticmethod
     def _parse_folder_triplet(folder_name: str):
@@ -837,25 +1570,44 @@ class FileUploadViewSet(viewsets.ViewSet):
         return result
 
     @staticmethod
-    def _find_first_file_with_exts(root: str, exts: list):
+    def _index_files(root: str):
+        """用os.scandir单次遍历目录树，返回文件索引:
+        {'files': [按遍历顺序的文件路径], 'by_ext': {小写扩展名: [(遍历序号, 路径), ...]}}
+        遍历顺序: 每层先按文件名排序的文件，再按名称排序递归子目录。
+        """
+        index = {'files': [], 'by_ext': {}}
         if not root or not os.path.isdir(root):
-            return None
-        exts_lower = [e.lower() for e in exts]
-        for dirpath, _, filenames in os.walk(root):
-            for fn in sorted(filenames):
-                if os.path.splitext(fn)[1].lower() in exts_lower:
-                    return os.path.join(dirpath, fn)
-        return None
+            return index
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    index['by_ext'].setdefault(ext, []).append((len(index['files']), entry.path))
+                    index['files'].append(entry.path)
+            # 逆序压栈，使子目录按名称顺序出栈
+            stack.extend(reversed(subdirs))
+        return index
+
+    @staticmethod
+    def _first_indexed_file(index: dict, exts: list):
+        """在文件索引中查找遍历顺序上第一个扩展名属于exts的文件"""
+        candidates = [index['by_ext'][e.lower()][0] for e in exts if e.lower() in index['by_ext']]
+        return min(candidates)[1] if candidates else None
 
     @staticmethod
-    def _pick_left_right_files(root: str):
+    def _pick_left_right_files(index: dict):
         """在目录中挑选左右手文件，优先匹配文件名包含 left/right 或 L/R 关键字；否则取前两个文件。"""
-        if not root or not os.path.isdir(root):
-            return None, None
-        files = []
-        for dirpath, _, filenames in os.walk(root):
-            for fn in sorted(filenames):
-                files.append(os.path.join(dirpath, fn))
+        files = index['files']
         if not files:
             return None, None
         left = None
@@ -872,13 +1624,175 @@ class FileUploadViewSet(viewsets.ViewSet):
             right = files[1]
         return left, right
     
+    # ---------------- 准入控制 ----------------
+    # 排队中/解压中的任务与容量占用记录(kind='reservation')共同占用容量：
+    #   reserved  - 预留接口申请的容量，有效期内未使用则过期
+    #   receiving - 已准入、正在接收请求体的上传，任务入队或失败时释放(进程退出时由心跳回收)
+    #   session   - 未完成的分块上传会话，finalize或会话过期清理时释放
+    # 判断在读取请求体之前进行，请求大小取自Content-Length(分块会话取total_size)。
+    # 先写入占用记录再统计(统计结果包含自身)，并发请求互相可见，不会同时通过同一份快照。
+    HOLD_STATUSES = ('receiving', 'session')
+    # 预留可覆盖的请求体大小余量(multipart的分隔符和表单字段)
+    _reservation_slack = 64 * 1024
+    
+    @classmethod
+    def _active_reservations(cls):
+        """计入容量的预留与占用：未过期的预留、正在接收的请求(进程退出后由心跳回收)，
+        以及在会话过期时间内有过写入的分块上传会话(放弃的会话无需等待手动cleanup即不再占用容量)"""
+        now = timezone.now()
+        return JobRecord.objects.filter(kind='reservation').filter(
+            Q(status='reserved', created_at__gte=now - timedelta(seconds=cls._reservation_ttl)) |
+            Q(status='session', updated_at__gte=now - timedelta(seconds=cls._upload_sessions_ttl)) |
+            Q(status='receiving')
+        )
+    
+    @classmethod
+    def _admission_snapshot(cls):
+        """当前占用的容量：任务数、待处理字节数、上传目录剩余空间"""
+        pending = JobRecord.objects.filter(
+            kind='extraction', status__in=['queued'] + JobStore.RUNNING_STATUSES['extraction']
+        ).aggregate(n=Count('id'), total=Sum('size_bytes'))
+        reserved = cls._active_reservations().aggregate(n=Count('id'), total=Sum('size_bytes'))
+        upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+        return {
+            'queue_depth': pending['n'] + reserved['n'],
+            'pending_bytes': (pending['total'] or 0) + (reserved['total'] or 0),
+            'reserved_bytes': reserved['total'] or 0,
+            'free_bytes': shutil.disk_usage(upload_dir).free,
+        }
+    
+    @classmethod
+    def _reject(cls, message, http_status, snapshot=None):
+        body = {'error': message, 'retry_after': cls._retry_after}
+        if snapshot:
+            body.update(snapshot)
+        return Response(body, status=http_status, headers={'Retry-After': str(cls._retry_after)})
+    
+    @classmethod
+    def _admit(cls, size_bytes, reservation_id=None, hold_status='receiving'):
+        """申请size_bytes字节的上传容量，返回(占用记录ID, None)或(None, 拒绝的Response)
+        带有效预留且大小不超过预留的请求直接把该预留转为hold_status(容量已在预留时计入)；
+        占用记录需在任务入队或上传失败后用_release_capacity释放。
+        """
+        if reservation_id:
+            fields = {}
+            if hold_status in JobStore.RUNNING_STATUSES['reservation']:
+                fields = {'worker_id': JobStore.worker_id(), 'heartbeat_at': timezone.now()}
+            consumed = JobRecord.objects.filter(
+                kind='reservation', job_id=reservation_id, status='reserved',
+                created_at__gte=timezone.now() - timedelta(seconds=cls._reservation_ttl),
+                size_bytes__gte=size_bytes - cls._reservation_slack
+            ).update(status=hold_status, updated_at=timezone.now(), **fields)
+            if consumed:
+                return reservation_id, None
+            print(f"[FileUpload] 预留不存在、已过期或小于请求大小({size_bytes} bytes): {reservation_id}, 按普通请求处理")
+        
+        if size_bytes > cls._max_pending_bytes:
+            return None, Response({'error': f'文件大小超过上限 {cls._max_pending_bytes} bytes'},
+                                  status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        hold_id = f"resv_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        JobStore.create(hold_id, 'reservation', status=hold_status, size_bytes=size_bytes)
+        snapshot = cls._admission_snapshot()
+        rejection = None
+        # 已排队的压缩包解压时还需要约等于自身大小的空间
+        if snapshot['free_bytes'] - snapshot['pending_bytes'] < cls._min_free_bytes:
+            print(f"[FileUpload] 磁盘空间不足，拒绝上传: 剩余 {snapshot['free_bytes']} bytes")
+            rejection = cls._reject('服务器磁盘空间不足，请稍后重试', status.HTTP_503_SERVICE_UNAVAILABLE, snapshot)
+        elif snapshot['queue_depth'] > cls._max_queue_depth:
+            rejection = cls._reject('解压队列已满，请稍后重试', status.HTTP_429_TOO_MANY_REQUESTS, snapshot)
+        elif snapshot['pending_bytes'] > cls._max_pending_bytes:
+            rejection = cls._reject('待处理数据量已达上限，请稍后重试', status.HTTP_429_TOO_MANY_REQUESTS, snapshot)
+        if rejection is not None:
+            JobRecord.objects.filter(job_id=hold_id).delete()
+            return None, rejection
+        return hold_id, None
+    
+    @classmethod
+    def _release_capacity(cls, hold_id):
+        """释放上传占用的容量(任务已入队并自行计入容量，或上传失败)"""
+        if hold_id:
+            JobRecord.objects.filter(
+                kind='reservation', job_id=hold_id, status__in=cls.HOLD_STATUSES
+            ).update(status='completed', completed_at=timezone.now(), updated_at=timezone.now())
+    
+    @staticmethod
+    def _content_length(request):
+        try:
+            return max(int(request.META.get('CONTENT_LENGTH') or 0), 0)
+        except ValueError:
+            return 0
+    
+    @staticmethod
+    def _reservation_id(request):
+        """预留ID只从query参数或请求头读取，避免为了取参数而提前解析请求体"""
+        return request.query_params.get('reservation_id') or request.headers.get('X-Reservation-Id', '')
+    
+    @action(detail=False, methods=['post'])
+    def reserve(self, request):
+        """预留上传容量：客户端发送数据前先申请，成功后在有效期内携带reservation_id上传"""
+        auth_token = request.data.get('auth_token', '')
+        if not auth_token:
+            return Response({'error': '缺少认证令牌'}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            size_bytes = int(request.data.get('size_bytes'))
+            if size_bytes <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': '缺少或无效的size_bytes参数'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        reservation_id, rejection = self._admit(size_bytes, hold_status='reserved')
+        if rejection is not None:
+            return rejection
+        
+        record = JobStore.get(reservation_id, 'reservation')
+        expires_at = record.created_at + timedelta(seconds=self._reservation_ttl)
+        print(f"[FileUpload] 预留上传容量: {reservation_id}, 大小: {size_bytes} bytes")
+        return Response({
+            'reservation_id': reservation_id,
+            'size_bytes': size_bytes,
+            'expires_at': JobStore.isoformat(expires_at)
+        }, status=status.HTTP_201_CREATED)
+    
+    def initialize_request(self, request, *args, **kwargs):
+        """upload接口：在请求体被解析前换上直写处理器，文件直接写到最终的 <upload_id>.zip"""
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'upload':
+            upload_id = f"upload_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+            upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+            zip_path = os.path.join(str(upload_dir), f"{upload_id}.zip")
+            self._upload_target = (upload_id, zip_path)
+            request.upload_handlers = [DirectToDiskUploadHandler(request, 'file', zip_path)]
+        return drf_request
+    
+    @staticmethod
+    def _discard_upload(file_obj, zip_path):
+        """丢弃已写入磁盘但不会被处理的上传文件"""
+        file_obj.close()
+        if isinstance(file_obj, DiskUploadedFile):
+            try:
+                os.remove(zip_path)
+            except FileNotFoundError:
+                pass
+    
     @action(detail=False, methods=['post'])
     def upload(self, request):
         """接收文件上传"""
+        hold_id = None
+        zip_path = None
+        enqueued = False
         try:
             # 确保解压线程已启动
             self._ensure_thread_started()
             
+            # 准入检查在访问request.FILES之前进行，被拒绝的请求不会写盘
+            hold_id, rejection = self._admit(self._content_length(request), self._reservation_id(request))
+            if rejection is not None:
+                return rejection
+            
+            # 上传ID与目标路径在initialize_request中确定，文件已由上传处理器直接写入该路径
+            upload_id, zip_path = self._upload_target
+            
             # 获取上传的文件
             file_obj = request.FILES.get('file')
             if not file_obj:
@@ -891,151 +1805,598 @@ class FileUploadViewSet(viewsets.ViewSet):
             
             # 简单的认证检查（可以根据需要扩展）
             if not auth_token:
+                self._discard_upload(file_obj, zip_path)
                 return Response({'error': '缺少认证令牌'}, status=status.HTTP_401_UNAUTHORIZED)
             
-            # 生成唯一的上传ID
-            upload_id = f"upload_{int(time.time())}_{uuid.uuid4().hex[:8]}"
-            
-            # 设置文件存储路径
-            upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
-            zip_filename = f"{upload_id}.zip"
-            zip_path = os.path.join(upload_dir, zip_filename)
-            
-            # 确保上传目录存在
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # 保存上传的文件
-            with open(zip_path, 'wb') as f:
-                for chunk in file_obj.chunks():
-                    f.write(chunk)
-            
-            print(f"[FileUpload] 文件上传成功: {zip_path}, 大小: {file_obj.size} bytes")
-            
-            # 从ZIP文件名中提取原始文件夹名称
-            # ZIP文件名格式: folder_name_upload_timestamp_random.zip
-            original_filename = file_obj.name
-            if '_' in original_filename and original_filename.endswith('.zip'):
-                # 去掉.zip后缀
-                name_without_ext = original_filename[:-4]
-                parts = name_without_ext.split('_')
-                
-                # 找到upload_开头的部分，去掉它和后面的部分
-                upload_index = -1
-                for i, part in enumerate(parts):
-                    if part == 'upload':
-                        upload_index = i
-                        break
-                
-                if upload_index > 0:
-                    # 提取upload之前的部分作为文件夹名称
-                    folder_name = '_'.join(parts[:upload_index])
-                else:
-                    folder_name = upload_id
+            if isinstance(file_obj, DiskUploadedFile):
+                sha256 = file_obj.sha256
             else:
-                folder_name = upload_id
-            
-            # 创建解压任务
-            extract_path = os.path.join(upload_dir, folder_name)
-            extraction_task = {
-                'task_id': upload_id,
-                'zip_path': zip_path,
-                'extract_path': extract_path,
-                'status': 'queued',
-                'created_at': datetime.now(),
-                'completed_at': None,
-                'error_message': '',
-                'device_id': device_id,
-                'original_task_id': task_id
-            }
+                # 未经过直写处理器(如被其他中间件提前解析)时，复制到目标路径并计算摘要
+                hasher = hashlib.sha256()
+                os.makedirs(os.path.dirname(zip_path), exist_ok=True)
+                with open(zip_path, 'wb') as f:
+                    for chunk in file_obj.chunks():
+                        hasher.update(chunk)
+                        f.write(chunk)
+                sha256 = hasher.hexdigest()
+            file_obj.close()
             
-            self._active_extractions[upload_id] = extraction_task
-            self._extraction_queue.append(extraction_task)
+            print(f"[FileUpload] 文件上传成功: {zip_path}, 大小: {file_obj.size} bytes, sha256: {sha256}")
+            
+            # 从ZIP文件名中提取原始文件夹名称并加入解压队列
+            folder_name = self._derive_folder_name(file_obj.name, upload_id)
+            self._enqueue_extraction(upload_id, zip_path, folder_name, device_id, task_id,
+                                     size_bytes=file_obj.size, sha256=sha256)
+            enqueued = True
             
             return Response({
                 'upload_id': upload_id,
                 'status': 'uploaded',
                 'message': '文件上传成功，正在解压...',
-                'file_size': file_obj.size
+                'file_size': file_obj.size,
+                'sha256': sha256
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
             print(f"[FileUpload] 上传处理错误: {e}")
+            if zip_path and not enqueued:
+                # 没有解压任务的压缩包不会再被处理，删除已写入(可能只写了一半)的文件
+                try:
+                    os.remove(zip_path)
+                except FileNotFoundError:
+                    pass
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            # 解压任务已入队(自身计入容量)或上传失败，释放接收期间占用的容量
+            self._release_capacity(hold_id)
     
-    @action(detail=False, methods=['get'])
-    def status(self, request):
-        """查询解压状态"""
-        upload_id = request.query_params.get('upload_id')
-        if not upload_id:
-            return Response({'error': '缺少upload_id参数'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if upload_id in self._active_extractions:
-            task = self._active_extractions[upload_id]
-            return Response({
-                'upload_id': task['task_id'],
-                'status': task['status'],
-                'created_at': task['created_at'].isoformat(),
-                'completed_at': task['completed_at'].isoformat() if task['completed_at'] else None,
-                'error_message': task['error_message'],
-                'extract_path': task['extract_path'] if task['status'] == 'completed' else None
-            })
-        else:
-            return Response({'error': '上传任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+    # 可识别的压缩包文件名后缀(较长的在前)
+    _ARCHIVE_SUFFIXES = ('.tar.zst', '.tar.lz4', '.tar', '.zip')
     
-    @action(detail=False, methods=['get'])
-    def list_uploads(self, request):
-        """列出所有上传任务"""
-        limit = int(request.query_params.get('limit', 50))
-        offset = int(request.query_params.get('offset', 0))
-        
-        # 获取任务列表
-        tasks = list(self._active_extractions.values())
-        tasks.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # 分页
-        paginated_tasks = tasks[offset:offset + limit]
+    @staticmethod
+    def _clean_filename(filename):
+        """校验客户端直接给出的文件名(query参数/请求头/会话参数)：只能是单个文件名，
+        不能包含路径分隔符或'..'，否则抛出ValueError"""
+        filename = filename or ''
+        if '/' in filename or '\\' in filename or '\x00' in filename or '..' in filename:
+            raise ValueError(f'无效的文件名: {filename}')
+        return filename
+    
+    @classmethod
+    def _derive_folder_name(cls, original_filename, upload_id):
+        """从上传文件名中解析原始文件夹名称
+        文件名格式: folder_name_upload_timestamp_random.zip(或.tar/.tar.zst/.tar.lz4)，解析失败时退回upload_id
+        """
+        # 文件夹名称只取文件名部分，确保解压目录位于上传目录之下
+        original_filename = os.path.basename(original_filename or '')
+        suffix = next((ext for ext in cls._ARCHIVE_SUFFIXES if (original_filename or '').endswith(ext)), None)
+        if suffix and '_' in original_filename:
+            # 去掉压缩包后缀
+            name_without_ext = original_filename[:-len(suffix)]
+            parts = name_without_ext.split('_')
+            
+            # 找到upload_开头的部分，去掉它和后面的部分
+            upload_index = -1
+            for i, part in enumerate(parts):
+                if part == 'upload':
+                    upload_index = i
+                    break
+            
+            if upload_index > 0:
+                # 提取upload之前的部分作为文件夹名称
+                folder_name = '_'.join(parts[:upload_index])
+                if folder_name not in ('.', '..'):
+                    return folder_name
+        return upload_id
+    
+    @classmethod
+    def _new_extraction_task(cls, upload_id, zip_path, folder_name, device_id='', task_id='',
+                             status='queued', size_bytes=0, sha256='', token_sha256=''):
+        """创建解压任务记录(持久化到JobRecord表)"""
+        upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+        extract_path = os.path.join(str(upload_dir), folder_name)
+        payload = {
+            'zip_path': zip_path,
+            'extract_path': extract_path,
+            'device_id': device_id,
+            'original_task_id': task_id,
+            'sha256': sha256
+        }
+        if token_sha256:
+            payload['token_sha256'] = token_sha256
+        return JobStore.create(upload_id, 'extraction', payload, status=status, size_bytes=size_bytes)
+    
+    @staticmethod
+    def _prepare_extract_path(record):
+        """创建解压目录，并在任务payload中记录该目录是否由本任务创建
+        同名episode之前上传的目录已存在时不算本任务创建，失败时不会被删除。
+        """
+        try:
+            os.makedirs(record.payload['extract_path'])
+            created = True
+        except FileExistsError:
+            created = False
+        record.payload = dict(record.payload, extract_created=created)
+        JobStore.update(record.job_id, payload=record.payload)
+        return created
+    
+    @staticmethod
+    def _remove_extract_path(payload):
+        """失败时删除解压了一半的目录；只删除本任务创建的目录，返回是否删除"""
+        if not payload.get('extract_created'):
+            return False
+        shutil.rmtree(payload['extract_path'], ignore_errors=True)
+        return True
+    
+    @classmethod
+    def _enqueue_extraction(cls, upload_id, zip_path, folder_name, device_id='', task_id='',
+                            size_bytes=0, sha256='', token_sha256=''):
+        """创建解压任务并加入解压队列"""
+        record = cls._new_extraction_task(upload_id, zip_path, folder_name, device_id, task_id,
+                                          size_bytes=size_bytes, sha256=sha256, token_sha256=token_sha256)
+        cls._extraction_queue.put(upload_id)
+        return record
+    
+    @action(detail=False, methods=['post'])
+    def upload_stream(self, request):
+        """流式上传：请求体即压缩包原始字节(zip/tar/tar.zst/tar.lz4，按文件头识别)，边接收边解压到目标目录
+        参数(query或请求头): filename/X-Filename, auth_token/X-Auth-Token, task_id, device_id
+        压缩包不落盘，接收完成时episode目录已解压完毕并写库。
+        """
+        params = request.query_params
+        auth_token = params.get('auth_token') or request.headers.get('X-Auth-Token', '')
+        if not auth_token:
+            return Response({'error': '缺少认证令牌'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # 没有声明大小的请求体无法做容量判断
+        size_bytes = self._content_length(request)
+        if not size_bytes:
+            return Response({'error': '流式上传需要Content-Length请求头'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            filename = self._clean_filename(params.get('filename') or request.headers.get('X-Filename', ''))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        hold_id, rejection = self._admit(size_bytes, self._reservation_id(request))
+        if rejection is not None:
+            return rejection
+        
+        upload_id = f"upload_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        folder_name = self._derive_folder_name(filename, upload_id)
+        JobStore.ensure_maintenance_started()
+        try:
+            # 解压任务以声明的大小计入容量后释放准入占用
+            record = self._new_extraction_task(
+                upload_id, None, folder_name,
+                params.get('device_id', ''), params.get('task_id', ''), status='extracting', size_bytes=size_bytes
+            )
+        finally:
+            self._release_capacity(hold_id)
+        extract_path = record.payload['extract_path']
+        
+        try:
+            self._prepare_extract_path(record)
+            head = read_head(request._request)
+            fmt = sniff_archive_format(head)
+            stream = PrefixedStream(head, request._request)
+            print(f"[FileUpload] 开始流式解压({fmt or 'zip'}): {upload_id} -> {extract_path}")
+            if fmt in TAR_FORMATS:
+                file_count = extract_tar_stream(stream, extract_path, fmt)
+            else:
+                file_count = StreamingZipExtractor(stream, extract_path).extract()
+            print(f"[FileUpload] 流式解压完成: {extract_path}, 文件数: {file_count}, 接收: {stream.bytes_read} bytes")
+        except Exception as e:
+            self._fail_stream_upload(record, f"流式解压失败: {e}")
+            return Response({'upload_id': upload_id, 'status': 'failed', 'error': str(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            self._generate_models_from_extracted_folder(extract_path)
+        except Exception as e:
+            # 未登记的数据不能算作上传完成，否则不会再被重新上传
+            self._fail_stream_upload(record, f"生成数据模型记录失败: {e}")
+            return Response({'upload_id': upload_id, 'status': 'failed', 'error': f'生成数据模型记录失败: {e}'},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        self._record_source_checksums(extract_path)
+        JobStore.update(upload_id, status='completed', size_bytes=stream.bytes_read,
+                        result={'extract_path': extract_path})
+        return Response({
+            'upload_id': upload_id,
+            'status': 'completed',
+            'message': '文件上传并解压完成',
+            'file_size': stream.bytes_read,
+            'file_count': file_count,
+            'extract_path': extract_path
+        }, status=status.HTTP_200_OK)
+    
+    @classmethod
+    def _fail_stream_upload(cls, record, error_message):
+        """流式上传失败：标记任务失败，并删除本任务创建的解压目录(压缩包不落盘，只能由客户端重新上传)"""
+        JobStore.update(record.job_id, status='failed', error_message=error_message)
+        print(f"[FileUpload] {error_message}: {record.job_id}")
+        if cls._remove_extract_path(record.payload):
+            print(f"[FileUpload] 已删除解压目录: {record.payload['extract_path']}")
+    
+    # ---------------- 分块断点续传 ----------------
+    # 会话元数据与已接收数据均落盘在 FILE_UPLOAD_DIR/.sessions 下，
+    # 已接收偏移量即 .part 文件大小，因此服务重启后仍可继续上传。
+    
+    @staticmethod
+    def _session_dir():
+        upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+        session_dir = os.path.join(upload_dir, '.sessions')
+        os.makedirs(session_dir, exist_ok=True)
+        return session_dir
+    
+    @classmethod
+    def _session_paths(cls, session_id):
+        """返回(元数据路径, 数据路径)；session_id不合法时返回(None, None)"""
+        if not session_id or not re.fullmatch(r'upload_\d+_[0-9a-f]{8}', session_id):
+            return None, None
+        session_dir = cls._session_dir()
+        return (os.path.join(session_dir, f"{session_id}.json"),
+                os.path.join(session_dir, f"{session_id}.part"))
+    
+    @classmethod
+    def _load_session(cls, session_id):
+        meta_path, part_path = cls._session_paths(session_id)
+        if not meta_path or not os.path.exists(meta_path):
+            return None, None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            session = json.load(f)
+        return session, part_path
+    
+    @staticmethod
+    def _check_session_token(request, session):
+        """校验分块上传请求的认证令牌(query参数auth_token或X-Auth-Token请求头，完成请求还可放在请求体中)，
+        须与创建会话时的令牌一致(会话完成后摘要保存在解压任务的payload中)；通过返回None，否则返回错误响应"""
+        auth_token = request.query_params.get('auth_token') or request.headers.get('X-Auth-Token', '')
+        if not auth_token and request.method == 'POST':
+            auth_token = request.data.get('auth_token', '')
+        if not auth_token:
+            return Response({'error': '缺少认证令牌'}, status=status.HTTP_401_UNAUTHORIZED)
+        expected = session.get('token_sha256')
+        digest = hashlib.sha256(auth_token.encode('utf-8')).hexdigest()
+        if expected and not hmac.compare_digest(digest, expected):
+            return Response({'error': '认证令牌与上传会话不匹配'}, status=status.HTTP_403_FORBIDDEN)
+        return None
+    
+    @classmethod
+    def _session_lock(cls, session_id):
+        with cls._session_locks_guard:
+            return cls._session_locks.setdefault(session_id, threading.Lock())
+    
+    @staticmethod
+    def _parse_chunk_offset(request):
+        """解析分块起始偏移：优先 Content-Range: bytes start-end/total，其次 offset 参数"""
+        content_range = request.headers.get('Content-Range', '')
+        if content_range:
+            m = re.fullmatch(r'\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*', content_range)
+            if not m:
+                raise ValueError(f'无效的Content-Range: {content_range}')
+            return int(m.group(1))
+        offset = request.query_params.get('offset')
+        if offset is None:
+            raise ValueError('缺少offset参数或Content-Range请求头')
+        return int(offset)
+    
+    @action(detail=False, methods=['post'])
+    def upload_session(self, request):
+        """创建分块上传会话"""
+        auth_token = request.data.get('auth_token', '')
+        if not auth_token:
+            return Response({'error': '缺少认证令牌'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        try:
+            filename = self._clean_filename(request.data.get('filename', ''))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            total_size = int(request.data.get('total_size'))
+            if total_size <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({'error': '缺少或无效的total_size参数'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # 会话未完成前一直占用total_size的容量
+        hold_id, rejection = self._admit(total_size, request.data.get('reservation_id'), hold_status='session')
+        if rejection is not None:
+            return rejection
+        
+        session_id = f"upload_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        meta_path, part_path = self._session_paths(session_id)
+        session = {
+            'session_id': session_id,
+            'hold_id': hold_id,
+            'filename': filename,
+            'total_size': total_size,
+            'task_id': request.data.get('task_id', ''),
+            'device_id': request.data.get('device_id', ''),
+            'created_at': datetime.now().isoformat(),
+            # 只保存令牌的摘要，后续分块/完成请求须携带同一令牌
+            'token_sha256': hashlib.sha256(auth_token.encode('utf-8')).hexdigest(),
+        }
+        # 先创建空数据文件，再写元数据，保证元数据存在时数据文件一定存在
+        open(part_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f, ensure_ascii=False)
+        
+        print(f"[FileUpload] 创建分块上传会话: {session_id}, 文件: {filename}, 大小: {total_size} bytes")
+        return Response({
+            'session_id': session_id,
+            'received': 0,
+            'total_size': total_size,
+            'chunk_size': self._upload_chunk_size
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['put'])
+    def upload_chunk(self, request):
+        """上传一个分块：请求体为原始字节，起始偏移由Content-Range或offset参数给出
+        偏移量不得超过已接收字节数；小于已接收字节数时视为重传并覆盖。
+        """
+        session_id = request.query_params.get('session_id')
+        session, part_path = self._load_session(session_id)
+        if session is None:
+            return Response({'error': '上传会话不存在'}, status=status.HTTP_404_NOT_FOUND)
+        denied = self._check_session_token(request, session)
+        if denied is not None:
+            return denied
+        
+        try:
+            offset = self._parse_chunk_offset(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        total_size = session['total_size']
+        with self._session_lock(session_id):
+            if not os.path.exists(part_path):
+                # 等待锁期间会话已完成或被清理
+                return Response({'error': '上传会话已结束'}, status=status.HTTP_409_CONFLICT)
+            received = os.path.getsize(part_path)
+            if offset < 0 or offset > received:
+                return Response({
+                    'error': '分块偏移不连续',
+                    'received': received,
+                    'total_size': total_size
+                }, status=status.HTTP_409_CONFLICT)
+            
+            # 直接从请求流读取并写入数据文件，不在内存中缓存整个分块
+            written = 0
+            with open(part_path, 'r+b') as f:
+                f.seek(offset)
+                while True:
+                    block = request._request.read(1024 * 1024)
+                    if not block:
+                        break
+                    if offset + written + len(block) > total_size:
+                        f.truncate(max(received, offset + written))
+                        return Response({'error': '分块超出文件总大小'}, status=status.HTTP_400_BAD_REQUEST)
+                    f.write(block)
+                    written += len(block)
+            received = max(received, offset + written)
+        if session.get('hold_id'):
+            # 刷新会话占用的最后活动时间，长期无写入的会话不再计入容量
+            JobRecord.objects.filter(job_id=session['hold_id'], status='session').update(updated_at=timezone.now())
+        
+        return Response({
+            'session_id': session_id,
+            'received': received,
+            'total_size': total_size,
+            'complete': received == total_size
+        })
+    
+    @action(detail=False, methods=['get'])
+    def upload_offset(self, request):
+        """查询分块上传会话已接收的字节数，用于断点续传"""
+        session_id = request.query_params.get('session_id')
+        session, part_path = self._load_session(session_id)
+        if session is None:
+            return Response({'error': '上传会话不存在'}, status=status.HTTP_404_NOT_FOUND)
+        denied = self._check_session_token(request, session)
+        if denied is not None:
+            return denied
+        received = os.path.getsize(part_path)
+        return Response({
+            'session_id': session_id,
+            'received': received,
+            'total_size': session['total_size'],
+            'complete': received == session['total_size']
+        })
+    
+    @action(detail=False, methods=['post'])
+    def upload_finalize(self, request):
+        """完成分块上传：校验大小后将文件移入上传目录并加入解压队列
+        重复完成(如客户端超时重试)时返回已创建的解压任务，不再重复处理。
+        """
+        session_id = request.data.get('session_id') or request.query_params.get('session_id')
+        session, part_path = self._load_session(session_id)
+        if session is None:
+            return self._finalized_session_response(request, session_id)
+        denied = self._check_session_token(request, session)
+        if denied is not None:
+            return denied
+        
+        self._ensure_thread_started()
+        with self._session_lock(session_id):
+            meta_path, _ = self._session_paths(session_id)
+            if not os.path.exists(meta_path):
+                # 等待锁期间另一个完成请求已处理了该会话
+                return self._finalized_session_response(request, session_id)
+            received = os.path.getsize(part_path)
+            if received != session['total_size']:
+                return Response({
+                    'error': '文件尚未上传完整',
+                    'received': received,
+                    'total_size': session['total_size']
+                }, status=status.HTTP_409_CONFLICT)
+            
+            upload_id = session_id
+            upload_dir = getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+            zip_path = os.path.join(upload_dir, f"{upload_id}.zip")
+            folder_name = self._derive_folder_name(session['filename'], upload_id)
+            os.replace(part_path, zip_path)
+            # 先创建解压任务再删除会话元数据，会话不存在时一定能查到它的解压任务
+            try:
+                # 令牌摘要转存到任务中，供重复的完成请求校验
+                self._enqueue_extraction(upload_id, zip_path, folder_name, session['device_id'], session['task_id'],
+                                         size_bytes=received, token_sha256=session.get('token_sha256', ''))
+            except Exception:
+                # 恢复会话的数据文件，客户端可以重试完成请求
+                os.replace(zip_path, part_path)
+                raise
+            os.remove(meta_path)
+            self._release_capacity(session.get('hold_id'))
+        with self._session_locks_guard:
+            self._session_locks.pop(session_id, None)
+        
+        print(f"[FileUpload] 分块上传完成: {zip_path}, 大小: {received} bytes")
+        return Response({
+            'upload_id': upload_id,
+            'status': 'uploaded',
+            'message': '文件上传成功，正在解压...',
+            'file_size': received
+        }, status=status.HTTP_200_OK)
+    
+    def _finalized_session_response(self, request, session_id):
+        """会话已不存在时的完成请求：会话已完成则返回其解压任务，否则返回404"""
+        record = JobStore.get(session_id, 'extraction') if self._session_paths(session_id)[0] else None
+        if record is None:
+            return Response({'error': '上传会话不存在'}, status=status.HTTP_404_NOT_FOUND)
+        denied = self._check_session_token(request, record.payload)
+        if denied is not None:
+            return denied
+        return Response({
+            'upload_id': record.job_id,
+            'status': 'uploaded',
+            'duplicate': True,
+            'extraction_status': record.status,
+            'message': '该会话已完成上传',
+            'file_size': record.size_bytes
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def status(self, request):
+        """查询解压状态"""
+        upload_id = request.query_params.get('upload_id')
+        if not upload_id:
+            return Response({'error': '缺少upload_id参数'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        record = JobStore.get(upload_id, 'extraction')
+        if record is None:
+            return Response({'error': '上传任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'upload_id': record.job_id,
+            'status': record.status,
+            'created_at': JobStore.isoformat(record.created_at),
+            'completed_at': JobStore.isoformat(record.completed_at),
+            'error_message': record.error_message,
+            'extract_path': record.payload['extract_path'] if record.status == 'completed' else None,
+            'file_size': record.size_bytes,
+            'sha256': record.payload.get('sha256', '')
+        })
+    
+    @action(detail=False, methods=['get'])
+    def list_uploads(self, request):
+        """列出所有上传任务"""
+        limit = int(request.query_params.get('limit', 50))
+        offset = int(request.query_params.get('offset', 0))
+        
+        # 获取任务列表
+        tasks = JobRecord.objects.filter(kind='extraction').order_by('-created_at')
+        
+        # 分页
+        paginated_tasks = tasks[offset:offset + limit]
         
         # 格式化返回数据
         result = []
-        for task in paginated_tasks:
+        for record in paginated_tasks:
             result.append({
-                'upload_id': task['task_id'],
-                'status': task['status'],
-                'created_at': task['created_at'].isoformat(),
-                'completed_at': task['completed_at'].isoformat() if task['completed_at'] else None,
-                'device_id': task['device_id'],
-                'original_task_id': task['original_task_id']
+                'upload_id': record.job_id,
+                'status': record.status,
+                'created_at': JobStore.isoformat(record.created_at),
+                'completed_at': JobStore.isoformat(record.completed_at),
+                'device_id': record.payload.get('device_id', ''),
+                'original_task_id': record.payload.get('original_task_id', '')
             })
         
         return Response({
             'uploads': result,
-            'total': len(tasks),
+            'total': tasks.count(),
             'limit': limit,
             'offset': offset
         })
     
+    @action(detail=False, methods=['post'])
+    def register_extracted(self, request):
+        """批量登记已解压到上传目录下的episode目录(一个事务)，用于补录
+        参数: folders - 上传目录下的目录名列表
+        """
+        folders = request.data.get('folders')
+        if not isinstance(folders, list) or not folders:
+            return Response({'error': '缺少folders参数'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        upload_dir = str(getattr(settings, 'FILE_UPLOAD_DIR', 'uploads'))
+        extract_paths = []
+        missing = []
+        for name in folders:
+            path = os.path.join(upload_dir, os.path.basename(str(name)))
+            if os.path.isdir(path):
+                extract_paths.append(path)
+            else:
+                missing.append(name)
+        
+        registered = self._register_extracted_folders(extract_paths)
+        return Response({
+            'registered': registered,
+            'requested': len(folders),
+            'missing': missing
+        })
+    
     @action(detail=False, methods=['delete'])
     def cleanup(self, request):
         """清理完成的任务"""
         try:
-            cleaned_count = 0
-            current_time = datetime.now()
-            
-            # 清理超过1小时的已完成任务
-            tasks_to_remove = []
-            for upload_id, task in self._active_extractions.items():
-                if (task['status'] in ['completed', 'failed'] and 
-                    task['completed_at'] and 
-                    (current_time - task['completed_at']).seconds > 3600):
-                    tasks_to_remove.append(upload_id)
+            # 清理超过1小时的已完成任务(含已使用的容量预留)
+            cleaned_count, _ = JobRecord.objects.filter(
+                kind__in=['extraction', 'reservation'],
+                status__in=JobStore.FINISHED_STATUSES,
+                completed_at__lt=timezone.now() - timedelta(hours=1)
+            ).delete()
+            # 清理过期未使用的容量预留
+            JobRecord.objects.filter(
+                kind='reservation', status='reserved',
+                created_at__lt=timezone.now() - timedelta(seconds=self._reservation_ttl)
+            ).delete()
             
-            for upload_id in tasks_to_remove:
-                del self._active_extractions[upload_id]
-                cleaned_count += 1
+            # 清理过期未完成的分块上传会话
+            cleaned_sessions = 0
+            session_dir = self._session_dir()
+            for name in os.listdir(session_dir):
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(session_dir, name)
+                if time.time() - os.path.getmtime(meta_path) <= self._upload_sessions_ttl:
+                    continue
+                # 以数据文件的最后写入时间为准，仍在续传的会话不清理
+                part_path = meta_path[:-len('.json')] + '.part'
+                if os.path.exists(part_path) and time.time() - os.path.getmtime(part_path) <= self._upload_sessions_ttl:
+                    continue
+                try:
+                    with open(meta_path, 'r', encoding='utf-8') as f:
+                        self._release_capacity(json.load(f).get('hold_id'))
+                except (OSError, ValueError):
+                    pass
+                for path in (meta_path, part_path):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                cleaned_sessions += 1
             
             return Response({
                 'message': f'清理了 {cleaned_count} 个过期任务',
-                'cleaned_count': cleaned_count
+                'cleaned_count': cleaned_count,
+                'cleaned_sessions': cleaned_sessions
             })
             
         except Exception as e:
@@ -1044,141 +2405,1143 @@ class FileUploadViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def info(self, request):
         """获取上传服务信息"""
+        with self._extraction_lock:
+            local_running = self._running_extractions
+        # 排队/运行数来自任务表，是所有工作进程的合计
+        counts = dict(
+            JobRecord.objects.filter(kind='extraction')
+            .values_list('status').annotate(n=Count('id')).order_by()
+        )
         return Response({
             'service_name': 'File Upload Service',
-            'active_extractions': len(self._active_extractions),
-            'running_extractions': self._running_extractions,
-            'queue_length': len(self._extraction_queue),
+            'active_extractions': sum(counts.values()),
+            'running_extractions': sum(counts.get(s, 0) for s in JobStore.RUNNING_STATUSES['extraction']),
+            'queue_length': counts.get('queued', 0),
+            'local_running_extractions': local_running,
+            'worker_id': JobStore.worker_id(),
             'max_concurrent_extractions': self._max_concurrent_extractions,
-            'upload_dir': getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')
+            'upload_dir': str(getattr(settings, 'FILE_UPLOAD_DIR', 'uploads')),
+            'admission': {
+                'max_queue_depth': self._max_queue_depth,
+                'max_pending_bytes': self._max_pending_bytes,
+                'min_free_bytes': self._min_free_bytes,
+                'retry_after': self._retry_after,
+                'reservation_ttl': self._reservation_ttl,
+                **self._admission_snapshot()
+            }
         })
 
 
+class ArchiveStreamBuffer:
+    """只能追加写入的缓冲区，供zipfile以不可seek的方式写入，再由生成器分块取走
+    zipfile检测到输出不支持tell/seek时会改用数据描述符记录大小和CRC，不需要回写。
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class RangeFileWrapper:
+    """只暴露文件中[start, start+length)区间的只读文件对象，供FileResponse分段返回
+    保留fileno()：WSGI服务器提供wsgi.file_wrapper(如gunicorn)时会从当前偏移用os.sendfile
+    发送Content-Length个字节，数据不经过Python；不支持时按块read()。
+    """
+
+    def __init__(self, f, start, length):
+        self.f = f
+        self.f.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        self.f.close()
+
+
+class ExportFileLinker:
+    """导出时放置单个文件的策略，由copy_with_checksum放置文件并返回其校验和
+    copy: 物理复制；hardlink: 硬链接(与uploads共享同一份数据，修改导出文件会影响源文件)；
+    reflink: 写时复制克隆(btrfs/xfs等)，不占额外空间且互不影响；
+    auto: 依次尝试reflink、hardlink，均不可用时复制。
+    源和目标不在同一文件系统或文件系统不支持时自动退回下一种方式，并记录各方式实际使用的次数。
+    """
+    MODES = ('copy', 'hardlink', 'reflink', 'auto')
+    FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+    # 这些错误说明当前文件系统/平台不支持该方式，之后不再尝试
+    UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP,
+                          errno.EINVAL, errno.ENOTTY}
+
+    def __init__(self, mode='copy'):
+        self.mode = mode
+        if mode == 'auto':
+            self.strategies = ['reflink', 'hardlink']
+        elif mode in ('reflink', 'hardlink'):
+            self.strategies = [mode]
+        else:
+            self.strategies = []
+        if fcntl is None and 'reflink' in self.strategies:
+            self.strategies.remove('reflink')
+        self.counts = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+        self._lock = threading.Lock()
+
+    def _reflink(self, src, dst):
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), self.FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+
+    def copy_with_checksum(self, src, dst, on_progress=None, sources=None):
+        """放置单个文件并返回其校验和，不再事后重读目标文件
+        物理复制时对复制循环中经过的数据块计算；链接/克隆的目标与源内容相同，
+        直接使用sources(SourceChecksums)中记录的源文件校验和，没有有效记录时才读取源文件。
+        on_progress不为空时以已放置的字节数回调(物理复制时分块回调，大文件也能看到进度)。
+        """
+        if self._link(src, dst):
+            digest = sources.get(src) if sources is not None else FileChecksum.of_file(src)
+            if on_progress is not None:
+                on_progress(os.path.getsize(dst))
+            return digest
+        digest = self._copy_hashing(src, dst, on_progress, sources)
+        self._count('copy')
+        return digest
+
+    def _link(self, src, dst):
+        """按配置依次尝试reflink/hardlink，成功返回True；都不可用时返回False，由调用方物理复制"""
+        if os.path.lexists(dst):
+            # 目标已存在时先删除：它可能是之前导出的硬链接，直接覆盖写会改动源文件
+            os.remove(dst)
+        for strategy in list(self.strategies):
+            try:
+                if strategy == 'reflink':
+                    self._reflink(src, dst)
+                else:
+                    os.link(src, dst)
+            except OSError as e:
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                if e.errno not in self.UNSUPPORTED_ERRNOS:
+                    raise
+                with self._lock:
+                    if strategy in self.strategies:
+                        self.strategies.remove(strategy)
+                print(f"[DEBUG] {strategy}不可用({os.strerror(e.errno)})，改用其他方式: {src}")
+                continue
+            self._count(strategy)
+            return True
+        return False
+
+    def _copy_hashing(self, src, dst, on_progress=None, sources=None):
+        """用户态读写复制，复用同一块缓冲区，写出的同时计算校验和"""
+        hasher = FileChecksum.new(FileChecksum.ALGORITHM)
+        buffer = bytearray(FileChecksum.READ_SIZE)
+        view = memoryview(buffer)
+        with open(src, 'rb', buffering=0) as fsrc, open(dst, 'wb') as fdst:
+            stat = os.fstat(fsrc.fileno())
+            while True:
+                n = fsrc.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+                fdst.write(view[:n])
+                if on_progress is not None:
+                    on_progress(n)
+        shutil.copystat(src, dst)
+        digest = hasher.hexdigest()
+        if sources is not None:
+            sources.put(src, stat, digest)
+        return digest
+
+    def _count(self, strategy):
+        with self._lock:
+            self.counts[strategy] += 1
+
+    def summary(self):
+        with self._lock:
+            return {'link_mode': self.mode, 'link_stats': dict(self.counts)}
+
+
+class ExportProgress:
+    """并行导出的进度计数(线程安全)
+    一个episode在其小文件复制完、且单独提交的大文件也全部完成后才算完成；
+    字节数按实际写出的数据累计(大文件分块累计)，总字节数来自导出前的预扫描。
+    工作线程只更新计数，由导出主线程定期调用report()汇总吞吐量和预计剩余时间并写入任务表。
+    """
+    # 平均吞吐量按指数移动平均计算的时间常数(秒)
+    EMA_SECONDS = 10.0
+
+    def __init__(self, total_episodes, total_bytes=0):
+        self.total_episodes = total_episodes
+        self.episodes_done = 0
+        self.total_bytes = total_bytes
+        self.bytes_done = 0
+        self._outstanding = {}  # episode -> 尚未完成的大文件数
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        # 以下只由调用report()的线程访问
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self._last_sample = (self.started, 0)
+        self._ema_rate = None
+
+    def add_bytes(self, n):
+        """累计已写出的字节数；导出已取消时抛出ExportCancelled，使正在复制的大文件在下一块时停止"""
+        if self._cancelled.is_set():
+            raise ExportCancelled()
+        with self._lock:
+            self.bytes_done += n
+
+    def cancel(self):
+        """由导出主线程在收到取消请求时调用，工作线程不访问数据库，只检查这个标志"""
+        self._cancelled.set()
+
+    def episode_scanned(self, episode_key, large_files):
+        """episode的小文件已复制完，另有large_files个大文件在单独复制"""
+        with self._lock:
+            if large_files:
+                self._outstanding[episode_key] = large_files
+            else:
+                self.episodes_done += 1
+
+    def large_file_done(self, episode_key):
+        with self._lock:
+            self._outstanding[episode_key] -= 1
+            if not self._outstanding[episode_key]:
+                del self._outstanding[episode_key]
+                self.episodes_done += 1
+
+    def report(self):
+        """计算当前吞吐量(距上次report)、移动平均吞吐量和预计剩余时间"""
+        now = time.monotonic()
+        with self._lock:
+            bytes_done, episodes_done = self.bytes_done, self.episodes_done
+        last_time, last_bytes = self._last_sample
+        elapsed = now - last_time
+        current_rate = (bytes_done - last_bytes) / elapsed if elapsed > 0 else 0.0
+        if elapsed > 0:
+            if now - self.started < self.EMA_SECONDS:
+                # 刚开始时样本太少，先用开始以来的平均值
+                self._ema_rate = bytes_done / (now - self.started)
+            else:
+                # 按实际间隔换算平滑系数，上报间隔不均匀时平均值仍对应同一时间窗口
+                alpha = 1 - math.exp(-elapsed / self.EMA_SECONDS)
+                self._ema_rate += alpha * (current_rate - self._ema_rate)
+            self._last_sample = (now, bytes_done)
+        self.last_report = now
+        
+        remaining = max(self.total_bytes - bytes_done, 0)
+        eta = round(remaining / self._ema_rate) if self._ema_rate else None
+        if self.total_bytes:
+            percent = int(min(bytes_done / self.total_bytes, 1) * 100)
+        else:
+            percent = int(episodes_done / max(self.total_episodes, 1) * 100)
+        return {
+            # 数据复制完后还要写清单和元数据，100只在任务完成时写入
+            'percent': min(percent, 99),
+            'episodes_done': episodes_done,
+            'bytes_done': bytes_done,
+            'bytes_total': self.total_bytes,
+            'throughput_mbps': round(current_rate / 1024 / 1024, 2),
+            'avg_throughput_mbps': round((self._ema_rate or 0) / 1024 / 1024, 2),
+            'eta_seconds': eta,
+            'elapsed_seconds': round(now - self.started, 1)
+        }
+
+
+class ProgressReader:
+    """包装只读文件对象，每次read后以读取的字节数回调(供tarfile.addfile等顺序读取场景汇报进度)"""
+
+    def __init__(self, f, on_read):
+        self.f = f
+        self.on_read = on_read
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.on_read(len(data))
+        return data
+
+
+class HashingWriter:
+    """包装只写文件对象，写入的同时计算校验和(供tarfile写分片时使用，写完不必重读分片)"""
+
+    def __init__(self, f, algorithm=None):
+        self.f = f
+        self.hasher = FileChecksum.new(algorithm or FileChecksum.ALGORITHM)
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def tell(self):
+        return self.size
+
+    def close(self):
+        self.f.close()
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+
+class FileChecksum:
+    """导出文件的快速校验和
+    依次选用 xxh3_128(xxhash)、BLAKE3(blake3)，都未安装时使用 hashlib.blake2b；
+    这些实现计算大块数据时都会释放GIL，可以在线程池中并行计算。
+    """
+    READ_SIZE = 4 * 1024 * 1024
+
+    if xxhash is not None:
+        ALGORITHM = 'xxh3_128'
+    elif blake3 is not None:
+        ALGORITHM = 'blake3'
+    else:
+        ALGORITHM = 'blake2b'
+
+    @staticmethod
+    def new(algorithm):
+        if algorithm == 'xxh3_128' and xxhash is not None:
+            return xxhash.xxh3_128()
+        if algorithm == 'blake3' and blake3 is not None:
+            return blake3.blake3()
+        if algorithm == 'blake2b':
+            return hashlib.blake2b()
+        raise ValueError(f'当前环境不支持校验算法: {algorithm}')
+
+    @classmethod
+    def of_file(cls, path, algorithm=None):
+        """计算文件的校验和(十六进制)，复用同一块缓冲区读取"""
+        hasher = cls.new(algorithm or cls.ALGORITHM)
+        buffer = bytearray(cls.READ_SIZE)
+        view = memoryview(buffer)
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+        return hasher.hexdigest()
+
+
+class SourceChecksums:
+    """episode目录中源文件校验和的持久记录(episode根目录下的.checksums.json，不在任何导出的子目录中)
+    解压完成时计算并写入；导出时硬链接/reflink的文件直接复用记录的校验和，不必重读源文件，
+    物理复制时在复制过程中算出的校验和也会补记进来。条目按相对路径记录大小、inode和修改时间，
+    文件被替换或修改后条目失效，重新计算。
+    """
+    FILENAME = '.checksums.json'
+
+    def __init__(self, root):
+        self.root = root
+        self.entries = {}
+        self.dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(os.path.join(root, self.FILENAME), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('algorithm') == FileChecksum.ALGORITHM:
+                self.entries = data.get('files') or {}
+        except (OSError, ValueError):
+            pass
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def get(self, path):
+        """源文件的校验和：记录有效时直接返回，否则读取文件计算并补记"""
+        stat = os.stat(path)
+        rel = self._rel(path)
+        with self._lock:
+            entry = self.entries.get(rel)
+        if (entry and entry.get('size') == stat.st_size and entry.get('ino') == stat.st_ino
+                and entry.get('mtime_ns') == stat.st_mtime_ns):
+            return entry['hash']
+        digest = FileChecksum.of_file(path)
+        self.put(path, stat, digest)
+        return digest
+
+    def put(self, path, stat, digest):
+        """记录源文件(按读取时的stat)的校验和"""
+        with self._lock:
+            self.entries[self._rel(path)] = {
+                'size': stat.st_size, 'ino': stat.st_ino, 'mtime_ns': stat.st_mtime_ns, 'hash': digest
+            }
+            self.dirty = True
+
+    def save(self):
+        """有新增条目时写回记录文件(先写临时文件再替换)；写入失败不影响导出"""
+        with self._lock:
+            if not self.dirty:
+                return
+            data = {'algorithm': FileChecksum.ALGORITHM, 'files': dict(self.entries)}
+            self.dirty = False
+        path = os.path.join(self.root, self.FILENAME)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[DEBUG] 写入源文件校验和记录失败 {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    @classmethod
+    def record(cls, root):
+        """计算目录下所有文件的校验和并写入记录(解压完成后调用)，返回记录的文件数"""
+        sources = cls(root)
+        count = 0
+        for dirpath, dirnames, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if dirpath == root and name.startswith(cls.FILENAME):
+                    continue
+                sources.get(path)
+                count += 1
+        sources.save()
+        return count
+
+
+class ExportStats:
+    """导出统计累加器(线程安全)
+    复制文件的同时累计文件数、字节数、按扩展名的分布以及导出目录中出现的目录，
+    task_catalog.json直接由这些累计值生成，不再重新遍历导出目录。
+    """
+
+    def __init__(self, export_path):
+        self.export_path = os.path.abspath(export_path)
+        self.file_count = 0
+        self.total_bytes = 0
+        self.file_types = {}
+        self.file_type_bytes = {}
+        self.checksums = {}  # 相对路径 -> (大小, 校验和)
+        self._dirs = set()
+        self._lock = threading.Lock()
+
+    def _add_dir(self, path):
+        # 记录目录及其尚未记录的上级目录(不含导出根目录)
+        path = os.path.normpath(path)
+        while path.startswith(self.export_path + os.sep) and path not in self._dirs:
+            self._dirs.add(path)
+            path = os.path.dirname(path)
+
+    def add_dir(self, path):
+        with self._lock:
+            self._add_dir(path)
+
+    def add_file(self, path, size, digest=None):
+        file_ext = os.path.splitext(path)[1].lower() or 'no_extension'
+        with self._lock:
+            self.file_count += 1
+            self.total_bytes += size
+            self.file_types[file_ext] = self.file_types.get(file_ext, 0) + 1
+            self.file_type_bytes[file_ext] = self.file_type_bytes.get(file_ext, 0) + size
+            self._add_dir(os.path.dirname(path))
+        if digest is not None:
+            self.add_checksum(path, size, digest)
+
+    def add_checksum(self, path, size, digest):
+        """只记录校验和，不计入文件统计(用于目录/task_info等元数据文件)"""
+        rel_path = os.path.relpath(os.path.normpath(path), self.export_path).replace(os.sep, '/')
+        with self._lock:
+            self.checksums[rel_path] = (size, digest)
+
+    def write_manifest(self, manifest_path, algorithm):
+        with self._lock:
+            files = {rel: {'size': size, 'hash': digest} for rel, (size, digest) in sorted(self.checksums.items())}
+        manifest = {
+            'algorithm': algorithm,
+            'created_at': datetime.now().isoformat(),
+            'file_count': len(files),
+            'total_bytes': sum(entry['size'] for entry in files.values()),
+            'files': files
+        }
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+    def file_statistics(self):
+        with self._lock:
+            return {
+                "file_count": self.file_count,
+                "directory_count": len(self._dirs),
+                "file_types": dict(self.file_types),
+                "file_type_bytes": dict(self.file_type_bytes)
+            }
+
+
+class ExportCancelled(Exception):
+    """导出任务被取消(由执行导出的线程在检查点抛出)"""
+
+
 class ExportViewSet(viewsets.ViewSet):
     """数据导出API"""
     
-    # 类级别的共享状态
-    _active_exports = {}
-    _export_queue = []
-    _running_exports = 0
-    _max_concurrent_exports = 2
+    # 导出任务状态保存在JobRecord表中(kind='export')，任意工作进程都可查询
+    # 调度：每个进程启动_max_concurrent_exports个导出工作线程，按优先级从任务表认领排队任务，
+    # 认领时检查所有进程正在执行的导出数(见JobStore.claim_next)，合计不超过_max_concurrent_exports
+    _max_concurrent_exports = getattr(settings, 'EXPORT_MAX_CONCURRENT', 2)
+    _export_wakeup = queue.Queue()  # 有新导出任务时唤醒本进程的工作线程
+    _export_scheduler_lock = threading.Lock()  # 保护工作线程启动
+    # 参与重复提交检查的状态，与JobRecord上unique_active_dedupe_key约束的条件一致
+    _dedupe_statuses = ('queued', 'preparing', 'processing')
+    _export_scheduler_threads = []
+    _export_scheduler_started = False
+    _cancel_check_interval = 1.0  # 执行中检查取消请求的最短间隔(秒)
+    _export_workers = getattr(settings, 'EXPORT_MAX_WORKERS', 8)  # 单个导出任务的复制线程数
+    _large_file_bytes = getattr(settings, 'EXPORT_LARGE_FILE_BYTES', 64 * 1024 * 1024)  # 超过该大小的文件单独提交复制
+    # full: 导出全部episode；incremental: 只导出未导出或导出后有变化的episode，完成后标记为已导出
+    _export_modes = ('full', 'incremental')
+    # directory: 按模态分目录的标准结构；webdataset: 每个episode为一个样本，打包进固定大小的tar分片
+    _export_formats = ('directory', 'webdataset')
+    _shard_size = getattr(settings, 'EXPORT_SHARD_SIZE', 1024 * 1024 * 1024)
+    # 任务payload中传给_execute_export的参数
+    _export_options = ('mode', 'link_mode', 'filters', 'export_format', 'shard_size')
     
     @action(detail=False, methods=['post'])
     def export_all(self, request):
-        """导出所有uploads下的数据到标准目录结构"""
+        """导出所有uploads下的数据到标准目录结构
+        参数: mode=full(默认)/incremental, link_mode=copy(默认)/hardlink/reflink/auto,
+              filters=按条件导出(见_build_task_filter)，为空时导出全部,
+              export_format=directory(默认，按模态分目录)/webdataset(按episode打包的tar分片), shard_size=分片字节数
+        """
         try:
-            # 生成导出任务ID
-            export_id = f"export_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+            mode = request.data.get('mode', 'full')
+            if mode not in self._export_modes:
+                return Response({'error': f'不支持的导出模式: {mode}'}, status=status.HTTP_400_BAD_REQUEST)
+            link_mode = request.data.get('link_mode', 'copy')
+            if link_mode not in ExportFileLinker.MODES:
+                return Response({'error': f'不支持的link_mode: {link_mode}'}, status=status.HTTP_400_BAD_REQUEST)
+            filters = request.data.get('filters') or {}
+            if not isinstance(filters, dict):
+                return Response({'error': 'filters必须是对象'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                self._build_task_filter(filters)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            export_format = request.data.get('export_format', 'directory')
+            if export_format not in self._export_formats:
+                return Response({'error': f'不支持的导出格式: {export_format}'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                shard_size = int(request.data.get('shard_size') or self._shard_size)
+                if shard_size <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({'error': '无效的shard_size参数'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                priority = int(request.data.get('priority') or 0)
+            except (TypeError, ValueError):
+                return Response({'error': '无效的priority参数'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # 创建导出任务
-            export_task = {
-                'export_id': export_id,
-                'status': 'queued',
-                'progress': 0,
-                'message': '等待处理',
-                'created_at': datetime.now(),
-                'completed_at': None,
-                'error_message': '',
-                'export_path': '',
-                'file_count': 0
+            payload = {
+                'mode': mode, 'link_mode': link_mode, 'filters': filters,
+                'export_format': export_format, 'shard_size': shard_size
             }
+            # 参数完全相同的导出已在排队或执行中(如重复点击)，直接返回该任务
+            export_id, duplicate = self._create_or_find_export(payload, priority)
+            if duplicate is not None and duplicate.status == 'queued' and priority > duplicate.priority:
+                JobStore.update(export_id, only_if_status=['queued'], priority=priority)
             
-            ExportViewSet._active_exports[export_id] = export_task
-            ExportViewSet._export_queue.append(export_task)
-            
-            # 启动导出线程
-            export_thread = threading.Thread(target=self._execute_export, args=(export_task,))
-            export_thread.start()
+            if duplicate is not None:
+                print(f"[Export] 已有相同参数的导出任务 {export_id}({duplicate.status})，不重复创建")
+            else:
+                self._ensure_scheduler_started()
+                self._export_wakeup.put(export_id)
             
             return Response({
                 'export_id': export_id,
-                'status': 'queued',
-                'message': '导出任务已创建'
+                'status': 'queued' if duplicate is None else duplicate.status,
+                'duplicate': duplicate is not None,
+                'priority': priority if duplicate is None else max(priority, duplicate.priority),
+                'mode': mode,
+                'link_mode': link_mode,
+                'filters': filters,
+                'export_format': export_format,
+                'message': '导出任务已创建' if duplicate is None else '相同的导出任务已在进行中'
             })
             
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
-    def _execute_export(self, export_task):
+    @classmethod
+    def _create_or_find_export(cls, payload, priority):
+        """创建导出任务；参数相同的任务已在排队/执行中时返回 (其export_id, 该任务)，否则返回 (新export_id, None)
+        去重键是参数的摘要，JobRecord上的部分唯一约束保证所有进程合计只有一个活动任务持有它：
+        并发提交中插入失败的一方转而返回已创建的任务。
+        """
+        dedupe_key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        while True:
+            duplicate = JobRecord.objects.filter(
+                kind='export', dedupe_key=dedupe_key, status__in=cls._dedupe_statuses
+            ).first()
+            if duplicate is not None:
+                return duplicate.job_id, duplicate
+            export_id = f"export_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+            try:
+                with transaction.atomic():
+                    JobStore.create(export_id, 'export', payload=payload, message='等待处理',
+                                    priority=priority, dedupe_key=dedupe_key)
+                return export_id, None
+            except IntegrityError:
+                # 另一个进程刚创建了相同参数的任务，重新查询(它若已结束则再次创建)
+                continue
+    
+    @classmethod
+    def _reset_after_fork(cls):
+        # 子进程中没有父进程的导出工作线程，重新初始化本进程的调度状态
+        cls._export_wakeup = queue.Queue()
+        cls._export_scheduler_lock = threading.Lock()
+        cls._export_scheduler_threads = []
+        cls._export_scheduler_started = False
+    
+    @classmethod
+    def _ensure_scheduler_started(cls):
+        """确保本进程的导出工作线程已启动"""
+        if cls._export_scheduler_started:
+            return
+        with cls._export_scheduler_lock:
+            if cls._export_scheduler_started:
+                return
+            JobStore.ensure_maintenance_started()
+            for i in range(max(1, cls._max_concurrent_exports)):
+                worker = threading.Thread(target=cls._export_worker, name=f"export-worker-{i}", daemon=True)
+                worker.start()
+                cls._export_scheduler_threads.append(worker)
+            cls._export_scheduler_started = True
+    
+    @classmethod
+    def _export_worker(cls):
+        """导出工作线程：被唤醒或等待超时(心跳间隔)后，在并发上限内按优先级认领排队的导出任务"""
+        interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
+        while True:
+            try:
+                cls._export_wakeup.get(timeout=interval)
+            except queue.Empty:
+                pass
+            close_old_connections()
+            try:
+                while True:
+                    record = JobStore.claim_next('export', 'preparing', limit=cls._max_concurrent_exports)
+                    if record is None:
+                        break
+                    cls()._run_export(record)
+            except Exception as e:
+                print(f"[Export] 导出队列处理错误: {e}")
+            finally:
+                close_old_connections()
+    
+    def _run_export(self, record):
+        """执行已认领的导出任务"""
+        options = {key: record.payload[key] for key in self._export_options if key in record.payload}
+        self._execute_export(record.job_id, **options)
+    
+    def _check_cancelled(self, export_id, force=False):
+        """检查是否收到取消请求(最多每_cancel_check_interval秒查询一次任务表)，收到时抛出ExportCancelled"""
+        now = time.time()
+        if not force and now - getattr(self, '_last_cancel_check', 0) < self._cancel_check_interval:
+            return
+        self._last_cancel_check = now
+        if JobRecord.objects.filter(job_id=export_id, status='cancelling').exists():
+            raise ExportCancelled()
+    
+    @action(detail=False, methods=['post'])
+    def cancel(self, request):
+        """取消导出任务：排队中的任务直接取消；执行中的任务在下一个检查点停止，并删除已写出的部分数据"""
+        export_id = request.data.get('export_id')
+        if not export_id:
+            return Response({'error': '缺少export_id参数'}, status=status.HTTP_400_BAD_REQUEST)
+        record = JobStore.get(export_id, 'export')
+        if record is None:
+            return Response({'error': '导出任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if JobStore.update(export_id, only_if_status=['queued'], status='cancelled', message='导出已取消'):
+            return Response({'export_id': export_id, 'status': 'cancelled', 'message': '导出已取消'})
+        if JobStore.update(export_id, only_if_status=['preparing', 'processing'], status='cancelling',
+                           message='正在取消...'):
+            return Response({'export_id': export_id, 'status': 'cancelling', 'message': '正在取消，稍后停止'})
+        
+        record.refresh_from_db()
+        return Response({'error': f'导出任务当前状态为{record.status}，无法取消', 'status': record.status},
+                        status=status.HTTP_409_CONFLICT)
+    
+    def _execute_export(self, export_id, mode='full', link_mode='copy', filters=None,
+                        export_format='directory', shard_size=None):
         """执行导出任务"""
+        linker = ExportFileLinker(link_mode)
+        export_path = None
         try:
-            export_task['status'] = 'preparing'
-            export_task['message'] = '准备导出...'
-            
-            # 生成导出目录名
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            export_dir_name = f"CMAvatar_data_{timestamp}"
-            
-            # 设置导出路径
-            base_dir = os.path.join(settings.BASE_DIR, 'export_output')
-            export_path = os.path.join(base_dir, export_dir_name)
-            
-            # 创建导出目录
-            os.makedirs(export_path, exist_ok=True)
-            # 使用绝对路径，确保跨平台兼容
-            export_task['export_path'] = os.path.abspath(export_path)
+            JobStore.update(export_id, message='准备导出...')
+            # 以开始时间作为导出时间：导出过程中发生变化的episode下次增量导出时会再次导出
+            started_at = timezone.now()
             
             # 扫描uploads目录
             uploads_dir = os.path.join(settings.BASE_DIR, 'uploads')
             if not os.path.exists(uploads_dir):
                 raise Exception("uploads目录不存在")
             
-            # 获取所有任务目录
-            task_dirs = [d for d in os.listdir(uploads_dir) 
-                        if os.path.isdir(os.path.join(uploads_dir, d)) and d != 'task_info']
+            # 获取所有任务目录(先按名称筛选，只对选中的目录访问文件系统)
+            task_dirs = [d for d in os.listdir(uploads_dir) if d != 'task_info' and not d.startswith('.')]
+            
+            # 增量导出/按条件导出：先在数据库中确定要导出的TaskInfo，再对应到目录
+            selected_pks = None
+            if mode == 'incremental' or filters:
+                queryset = TaskInfo.objects.all()
+                if filters:
+                    queryset = queryset.filter(self._build_task_filter(filters))
+                if mode == 'incremental':
+                    queryset = queryset.filter(Q(exported=False) | Q(updated_at__gt=F('exported_at')))
+                task_dirs, selected_pks = self._select_task_dirs(task_dirs, queryset)
+                if not task_dirs:
+                    message = '没有需要导出的新数据' if mode == 'incremental' else '没有符合条件的数据'
+                    JobStore.update(export_id, status='completed', progress=100, message=message,
+                                    result={'export_path': '', 'file_count': 0, 'mode': mode, 'episode_count': 0})
+                    return
+            
+            dir_flags = [os.path.isdir(os.path.join(uploads_dir, d)) for d in task_dirs]
+            if selected_pks is not None:
+                selected_pks = [pk for pk, is_dir in zip(selected_pks, dir_flags) if is_dir]
+            task_dirs = [d for d, is_dir in zip(task_dirs, dir_flags) if is_dir]
             
             if not task_dirs:
                 raise Exception("没有找到任何任务数据")
             
-            export_task['status'] = 'processing'
-            export_task['message'] = f'正在处理 {len(task_dirs)} 个任务...'
+            self._check_cancelled(export_id, force=True)
             
-            total_files = 0
+            # 预扫描待导出的数据量，进度按字节计算
+            JobStore.update(export_id, message=f'正在统计 {len(task_dirs)} 个任务的数据量...')
+            progress = ExportProgress(len(task_dirs), self._scan_export_bytes(uploads_dir, task_dirs))
             
-            # 处理每个任务目录
-            for i, task_dir in enumerate(task_dirs):
-                task_path = os.path.join(uploads_dir, task_dir)
-                
-                # 解析任务ID和episode ID
-                task_id, episode_id = self._parse_task_info(task_dir)
-                
-                # 创建目标目录结构
-                self._create_target_structure(export_path, task_id, episode_id)
-                
-                # 复制文件
-                files_copied = self._copy_task_files(task_path, export_path, task_id, episode_id)
-                total_files += files_copied
-                
-                # 更新进度
-                progress = int((i + 1) / len(task_dirs) * 100)
-                export_task['progress'] = progress
-                export_task['message'] = f'已处理 {i + 1}/{len(task_dirs)} 个任务'
+            # 生成导出目录名
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            export_dir_name = f"CMAvatar_data_{timestamp}"
+            
+            # 设置导出路径
+            base_dir = os.path.join(settings.BASE_DIR, 'export_output')
+            os.makedirs(base_dir, exist_ok=True)
+            
+            # 创建导出目录(同一秒内开始的导出加序号区分，不与其他导出共用目录)
+            export_path = os.path.join(base_dir, export_dir_name)
+            suffix = 1
+            while True:
+                try:
+                    os.mkdir(export_path)
+                    break
+                except FileExistsError:
+                    export_path = os.path.join(base_dir, f"{export_dir_name}_{suffix}")
+                    suffix += 1
+            # 使用绝对路径，确保跨平台兼容
+            export_path = os.path.abspath(export_path)
+            progress.result_base = {'export_path': export_path, 'file_count': 0, 'mode': mode}
+            JobStore.update(export_id, result={**progress.result_base, 'bytes_done': 0,
+                                               'bytes_total': progress.total_bytes})
+            
+            if not JobStore.update(export_id, only_if_status=['preparing'], status='processing',
+                                   message=f'正在处理 {len(task_dirs)} 个任务...'):
+                raise ExportCancelled()
+            
+            # 并行处理各任务目录，统计信息在复制时累计
+            stats = ExportStats(export_path)
+            shard_summary = {}
+            if export_format == 'webdataset':
+                shard_summary = self._export_shards(export_id, uploads_dir, task_dirs, export_path, stats,
+                                                    shard_size or self._shard_size, progress)
+            else:
+                self._export_task_dirs(export_id, uploads_dir, task_dirs, export_path, linker, stats, progress)
+            total_files = stats.file_count
+            byte_summary = self._report_export_progress(export_id, progress, force=True)
             
             # 创建task_catalog.json
-            self._create_task_catalog(export_path, task_dirs)
+            self._create_task_catalog(export_path, task_dirs, stats, mode, linker.summary())
 
             # 生成 task_info JSON（模仿客户端导出结构）
             try:
-                task_info_count = self._export_task_info_json(export_path)
+                task_info_count = self._export_task_info_json(export_path, selected_pks)
             except Exception as e:
                 task_info_count = 0
                 print(f"导出 task_info 失败: {e}")
             
-            # 完成导出
-            export_task['status'] = 'completed'
-            export_task['progress'] = 100
-            export_task['message'] = f'导出完成，共处理 {total_files} 个文件；task_info: {task_info_count} 个'
-            export_task['file_count'] = total_files
-            export_task['completed_at'] = datetime.now()
+            # 列式元数据表(每个episode一行)，便于pandas/DuckDB直接筛选
+            metadata_summary = {}
+            try:
+                metadata_summary = self._export_metadata_table(export_path, selected_pks)
+            except Exception as e:
+                print(f"导出元数据表失败: {e}")
+            
+            # 校验清单：数据文件的校验和已在复制时算好，这里补上task_info和目录文件
+            self._write_checksum_manifest(export_path, stats)
+            self._check_cancelled(export_id, force=True)
+            
+            # 增量导出：全部复制完成后在一个事务中批量标记为已导出，中途失败或取消则不标记；
+            # 完成状态与标记在同一事务中写入，取消请求晚于此时到达则不再生效
+            with transaction.atomic():
+                completed = JobStore.update(
+                    export_id,
+                    only_if_status=['processing'],
+                    status='completed',
+                    progress=100,
+                    message=f'导出完成，共处理 {total_files} 个文件；task_info: {task_info_count} 个',
+                    result={'export_path': export_path, 'file_count': total_files, 'mode': mode,
+                            'episode_count': len(task_dirs), **linker.summary(), **shard_summary,
+                            **metadata_summary,
+                            'bytes_done': byte_summary['bytes_done'], 'bytes_total': byte_summary['bytes_total'],
+                            'avg_throughput_mbps': round(byte_summary['bytes_done'] / 1024 / 1024 /
+                                                         max(byte_summary['elapsed_seconds'], 0.1), 2),
+                            'elapsed_seconds': byte_summary['elapsed_seconds']}
+                )
+                if not completed:
+                    raise ExportCancelled()
+                if mode == 'incremental':
+                    for chunk in self._chunked(selected_pks):
+                        TaskInfo.objects.filter(pk__in=chunk).update(exported=True, exported_at=started_at)
             
+        except ExportCancelled:
+            # 删除已写出的部分数据
+            if export_path and os.path.isdir(export_path):
+                shutil.rmtree(export_path, ignore_errors=True)
+            JobStore.update(export_id, status='cancelled', progress=0, message='导出已取消',
+                            result={'export_path': '', 'file_count': 0, 'mode': mode})
+            print(f"[Export] 导出任务已取消: {export_id}")
         except Exception as e:
-            export_task['status'] = 'failed'
-            export_task['error_message'] = str(e)
-            export_task['completed_at'] = datetime.now()
+            JobStore.update(export_id, status='failed', error_message=str(e))
             print(f"导出失败: {e}")
+    
+    def _scan_episode_bytes(self, task_path):
+        """统计一个episode中会被导出的文件(标准目录映射下的子目录)的总字节数"""
+        total = 0
+        for source_dir in self._TASK_DIR_MAPPINGS:
+            real_source_dir = self._find_subdir_case_insensitive(task_path, source_dir)
+            if not real_source_dir:
+                continue
+            stack = [os.path.join(task_path, real_source_dir)]
+            while stack:
+                try:
+                    with os.scandir(stack.pop()) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.is_file():
+                                total += entry.stat().st_size
+                except OSError:
+                    continue
+        return total
+    
+    def _scan_export_bytes(self, uploads_dir, task_dirs):
+        """导出前并行预扫描待导出的总字节数(只读目录项和文件大小，不读文件内容)"""
+        with ThreadPoolExecutor(max_workers=max(1, self._export_workers), thread_name_prefix='export-scan') as pool:
+            return sum(pool.map(self._scan_episode_bytes, [os.path.join(uploads_dir, d) for d in task_dirs]))
+    
+    def _report_export_progress(self, export_id, progress, force=False):
+        """汇总字节进度、吞吐量和预计剩余时间写入任务表(最多每秒一次)，返回汇总结果"""
+        if not force and time.monotonic() - progress.last_report < 1:
+            return None
+        report = progress.report()
+        message = (f"已处理 {report['episodes_done']}/{progress.total_episodes} 个任务，"
+                   f"{report['bytes_done'] / 1024 ** 3:.2f}/{report['bytes_total'] / 1024 ** 3:.2f} GB，"
+                   f"{report['avg_throughput_mbps']} MB/s")
+        if report['eta_seconds'] is not None:
+            message += f"，预计剩余 {report['eta_seconds']} 秒"
+        JobStore.update(export_id, progress=report['percent'], message=message,
+                        result={**getattr(progress, 'result_base', {}), **report})
+        return report
+    
+    def _export_task_dirs(self, export_id, uploads_dir, task_dirs, export_path, linker, stats, progress):
+        """用线程池并行导出各episode目录，复制的文件计入stats
+        每个episode一个任务，其中的大文件再各自提交为独立任务，使少数大视频不会拖住整个episode；
+        工作线程不访问数据库，进度由当前线程每秒汇总写入任务表。
+        """
+        pool = ThreadPoolExecutor(max_workers=max(1, self._export_workers), thread_name_prefix='export')
+        try:
+            pending = {
+                pool.submit(self._export_episode, pool, progress, os.path.join(uploads_dir, task_dir),
+                            export_path, linker, stats)
+                for task_dir in task_dirs
+            }
+            while pending:
+                done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # episode任务返回其大文件任务，大文件任务返回空列表
+                    pending.update(future.result())
+                # 取消时退出，finally中丢弃尚未开始的复制任务，正在复制的文件在下一块时停止
+                self._check_cancelled(export_id)
+                self._report_export_progress(export_id, progress)
+        except BaseException:
+            # 取消或任一文件失败时，通知正在复制的线程在下一块时停止，不再等大文件复制完
+            progress.cancel()
+            raise
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _export_episode(self, pool, progress, task_path, export_path, linker, stats):
+        """导出一个episode目录(在线程池中执行)：小文件直接复制，大文件提交到线程池
+        返回大文件任务列表。
+        """
+        # 解析任务ID和episode ID
+        task_id, episode_id = self._parse_task_info(os.path.basename(task_path))
+        
+        # 创建目标目录结构
+        self._create_target_structure(export_path, task_id, episode_id, stats)
+        
+        large_files = []
+        # 解压时记录的源文件校验和，链接导出的文件直接复用
+        sources = SourceChecksums(task_path)
+        
+        def copy_function(src, dst):
+            size = os.path.getsize(src)
+            if size >= self._large_file_bytes:
+                large_files.append((src, dst, size))
+            else:
+                # 校验和在复制过程中计算，不再重读导出文件
+                stats.add_file(dst, size, linker.copy_with_checksum(src, dst, sources=sources))
+                progress.add_bytes(size)
+            return dst
+        
+        # 复制文件
+        self._copy_task_files(task_path, export_path, task_id, episode_id, copy_function)
+        sources.save()
+        progress.episode_scanned(task_path, len(large_files))
+        return [
+            pool.submit(self._copy_large_file, progress, stats, task_path, src, dst, size, linker, sources)
+            for src, dst, size in large_files
+        ]
+    
+    @staticmethod
+    def _copy_large_file(progress, stats, episode_key, src, dst, size, linker, sources):
+        """复制单个大文件；失败时异常经future.result()传回_export_task_dirs，使整个导出失败"""
+        try:
+            stats.add_file(dst, size, linker.copy_with_checksum(src, dst, on_progress=progress.add_bytes,
+                                                                sources=sources))
+            sources.save()
+        finally:
+            progress.large_file_done(episode_key)
+        return []
+    
+    def _sample_task_info(self, task_dirs):
+        """按目录名中的episode_id批量取出TaskInfo，作为样本的task_info元数据"""
+        episode_ids = [self._parse_task_info(d)[1] for d in task_dirs]
+        infos = {}
+        for chunk in self._chunked(episode_ids):
+            for task in TaskInfo.objects.filter(episode_id__in=chunk).select_related('collector'):
+                infos[task.episode_id] = {
+                    'episode_id': task.episode_id,
+                    'task_id': task.task_id,
+                    'task_name': task.task_name or '',
+                    'task_name_cn': task.task_name_cn or '',
+                    'init_scene_text': task.init_scene_text or '',
+                    'label_info': {'action_config': task.action_config or []},
+                    'task_status': task.task_status,
+                    'collector_id': task.collector.collector_id,
+                }
+        return infos
+    
+    def _sample_members(self, task_path, key):
+        """列出一个episode样本的成员：(成员名, 源文件路径, 大小)
+        成员名为 key.模态.相对路径(路径分隔符替换为'__')，模态取标准目录结构的顶层目录名，
+        使同一样本的文件在tar中相邻且共享同一个key(WebDataset按第一个'.'之前的部分分组)。
+        """
+        members = []
+        for source_dir, target_template in self._TASK_DIR_MAPPINGS.items():
+            real_source_dir = self._find_subdir_case_insensitive(task_path, source_dir)
+            if not real_source_dir:
+                continue
+            modality = target_template.split('/')[0]
+            source_root = os.path.join(task_path, real_source_dir)
+            for root, dirs, filenames in os.walk(source_root):
+                dirs.sort()
+                for filename in sorted(filenames):
+                    file_path = os.path.join(root, filename)
+                    rel_path = os.path.relpath(file_path, source_root).replace(os.sep, '__')
+                    members.append((f"{key}.{modality}.{rel_path}", file_path, os.path.getsize(file_path)))
+        return members
+    
+    @staticmethod
+    def _shard_member_entry(tar, tarinfo):
+        """刚写入tar的成员在分片中的数据偏移(addfile内部复制了tarinfo，偏移只能由当前写入位置倒推)"""
+        padded_size = -(-tarinfo.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+        return {'name': tarinfo.name, 'offset_data': tar.offset - padded_size, 'size': tarinfo.size}
+    
+    def _export_shards(self, export_id, uploads_dir, task_dirs, export_path, stats, shard_size, progress):
+        """WebDataset格式导出：每个episode为一个样本(key = task_id-episode_id)，按顺序写入
+        shards/shard-NNNNNN.tar，单个分片写满shard_size后换下一个(样本不跨分片)，
+        并生成shards/index.json记录每个样本所在分片与各成员的数据偏移，便于随机访问。
+        """
+        shard_dir = os.path.join(export_path, 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+        task_infos = self._sample_task_info(task_dirs)
+        
+        shards = []
+        tar = None
+        shard = None
+        shard_file = None
         
+        def on_read(n):
+            progress.add_bytes(n)
+            self._check_cancelled(export_id)
+            self._report_export_progress(export_id, progress)
+        
+        def close_shard():
+            # 分片的校验和在写入时已经算好，不再重读分片
+            tar.close()
+            shard_file.close()
+            shard['size'] = shard_file.size
+            stats.add_file(os.path.join(shard_dir, shard['name']), shard['size'], shard_file.hexdigest())
+            shards.append(shard)
+        
+        try:
+            for i, task_dir in enumerate(sorted(task_dirs)):
+                task_id, episode_id = self._parse_task_info(task_dir)
+                # key中不能出现'.'，否则会被当作扩展名的分隔符
+                key = f"{task_id}-{episode_id}".replace('.', '_')
+                task_info = json.dumps(task_infos.get(episode_id, {'episode_id': episode_id, 'task_id': task_id}),
+                                       ensure_ascii=False, indent=2).encode('utf-8')
+                members = self._sample_members(os.path.join(uploads_dir, task_dir), key)
+                sample_bytes = len(task_info) + sum(size for _, _, size in members) + 1024 * (len(members) + 1)
+                
+                if tar is not None and shard['samples'] and tar.offset + sample_bytes > shard_size:
+                    close_shard()
+                    tar = None
+                if tar is None:
+                    shard = {'name': f"shard-{len(shards):06d}.tar", 'samples': []}
+                    shard_file = HashingWriter(open(os.path.join(shard_dir, shard['name']), 'wb'))
+                    tar = tarfile.open(fileobj=shard_file, mode='w', format=tarfile.PAX_FORMAT)
+                
+                sample = {'key': key, 'task_dir': task_dir, 'offset': tar.offset, 'members': []}
+                tarinfo = tarfile.TarInfo(f"{key}.task_info.json")
+                tarinfo.size = len(task_info)
+                tarinfo.mtime = int(time.time())
+                tar.addfile(tarinfo, io.BytesIO(task_info))
+                sample['members'].append(self._shard_member_entry(tar, tarinfo))
+                for name, file_path, size in members:
+                    tarinfo = tar.gettarinfo(file_path, arcname=name)
+                    with open(file_path, 'rb') as f:
+                        # 写入大文件的过程中也按读取的字节数更新进度、检查取消请求
+                        tar.addfile(tarinfo, ProgressReader(f, on_read))
+                    sample['members'].append(self._shard_member_entry(tar, tarinfo))
+                sample['size'] = tar.offset - sample['offset']
+                shard['samples'].append(sample)
+                progress.episode_scanned(task_dir, 0)
+                on_read(0)
+            if tar is not None:
+                close_shard()
+                tar = None
         finally:
-            ExportViewSet._running_exports -= 1
+            # 出错或取消时关闭未写完的分片
+            if tar is not None:
+                tar.close()
+                shard_file.close()
+        
+        index = {
+            'format': 'webdataset',
+            'shard_size': shard_size,
+            'shard_count': len(shards),
+            'sample_count': sum(len(s['samples']) for s in shards),
+            'shards': shards
+        }
+        index_path = os.path.join(shard_dir, 'index.json')
+        data = json.dumps(index, ensure_ascii=False, indent=2).encode('utf-8')
+        with open(index_path, 'wb') as f:
+            f.write(data)
+        hasher = FileChecksum.new(FileChecksum.ALGORITHM)
+        hasher.update(data)
+        stats.add_file(index_path, len(data), hasher.hexdigest())
+        print(f"[Export] 分片导出完成: {index['shard_count']} 个分片, {index['sample_count']} 个样本")
+        return {'shard_count': index['shard_count'], 'sample_count': index['sample_count']}
+    
+    # 批量查询/更新时每条SQL携带的主键数，避免超出数据库的参数个数限制
+    _pk_chunk_size = 500
+    
+    @classmethod
+    def _chunked(cls, items):
+        for i in range(0, len(items), cls._pk_chunk_size):
+            yield items[i:i + cls._pk_chunk_size]
+    
+    # filters支持的条件；除日期外均可为字符串(逗号分隔)或列表
+    _filter_keys = ('collector_id', 'task_status', 'task_ids', 'target_customer', 'created_from', 'created_to')
+    
+    @classmethod
+    def _build_task_filter(cls, filters):
+        """把导出请求中的filters转换为TaskInfo查询条件，条件不合法时抛出ValueError
+        collector_id: 采集者ID；task_status: 任务状态；task_ids: 业务task_id；target_customer: 采集者的目标客户；
+        created_from/created_to: 创建时间范围(含边界)，只给日期时按整天计算
+        """
+        def as_list(value):
+            if isinstance(value, (list, tuple)):
+                return [str(v).strip() for v in value if str(v).strip()]
+            return [v.strip() for v in str(value).split(',') if v.strip()]
+        
+        unknown = set(filters) - set(cls._filter_keys)
+        if unknown:
+            raise ValueError(f'不支持的过滤条件: {", ".join(sorted(unknown))}')
+        
+        condition = Q()
+        if filters.get('collector_id'):
+            condition &= Q(collector__collector_id__in=as_list(filters['collector_id']))
+        if filters.get('task_status'):
+            statuses = as_list(filters['task_status'])
+            invalid = set(statuses) - {value for value, _ in TaskInfo.STATUS_CHOICES}
+            if invalid:
+                raise ValueError(f'无效的任务状态: {", ".join(sorted(invalid))}')
+            condition &= Q(task_status__in=statuses)
+        if filters.get('task_ids'):
+            condition &= Q(task_id__in=as_list(filters['task_ids']))
+        if filters.get('target_customer'):
+            condition &= Q(collector__target_customer__in=as_list(filters['target_customer']))
+        for key, lookup in (('created_from', 'gte'), ('created_to', 'lte')):
+            value = filters.get(key)
+            if not value:
+                continue
+            value = str(value)
+            day = parse_date(value)
+            if day is not None:
+                condition &= Q(**{f'created_at__date__{lookup}': day})
+                continue
+            moment = parse_datetime(value)
+            if moment is None:
+                raise ValueError(f'无效的时间: {key}={value}')
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            condition &= Q(**{f'created_at__{lookup}': moment})
+        return condition
+    
+    def _select_task_dirs(self, task_dirs, queryset):
+        """只保留与queryset中TaskInfo对应的episode目录
+        目录按名称中的episode_id与TaskInfo对应，没有对应TaskInfo的目录不导出。
+        返回(目录列表, 对应TaskInfo主键列表)。
+        """
+        candidates = dict(queryset.values_list('episode_id', 'pk'))
+        selected, pks = [], []
+        for task_dir in task_dirs:
+            _, episode_id = self._parse_task_info(task_dir)
+            pk = candidates.pop(episode_id, None)
+            if pk is not None:
+                selected.append(task_dir)
+                pks.append(pk)
+        print(f"[Export] 选中 {len(selected)}/{len(task_dirs)} 个目录")
+        return selected, pks
     
     def _parse_task_info(self, task_dir_name):
         """从目录名解析task_id和episode_id"""
@@ -1196,7 +3559,7 @@ class ExportViewSet(viewsets.ViewSet):
         # 如果解析失败，使用默认值
         return "unknown", "unknown"
     
-    def _create_target_structure(self, export_path, task_id, episode_id):
+    def _create_target_structure(self, export_path, task_id, episode_id, stats=None):
         """创建目标目录结构"""
         dirs_to_create = [
             f"task_info",
@@ -1214,31 +3577,34 @@ class ExportViewSet(viewsets.ViewSet):
         for dir_path in dirs_to_create:
             full_path = os.path.join(export_path, dir_path)
             os.makedirs(full_path, exist_ok=True)
+            if stats is not None:
+                stats.add_dir(full_path)
+    
+    # 源目录到目标目录的映射
+    _TASK_DIR_MAPPINGS = {
+        'parameters': 'parameters/{task_id}/{episode_id}',
+        'skeleton': 'skeletonData/{task_id}/{episode_id}',
+        'kinematic': 'kinematicData/{task_id}/{episode_id}',
+        'IMU': 'imu/{task_id}/{episode_id}',
+        'Tactile': 'tactileFeedback/{task_id}/{episode_id}',
+        'tactileFeedback': 'tactileFeedback/{task_id}/{episode_id}',
+        'tactile_feedback': 'tactile_feedback/{task_id}/{episode_id}',
+        'video': 'observations/{task_id}/{episode_id}/videos',
+        'object': 'object/{task_id}/{episode_id}'
+    }
     
-    def _copy_task_files(self, source_path, export_path, task_id, episode_id):
-        """复制任务文件到目标结构"""
+    def _copy_task_files(self, source_path, export_path, task_id, episode_id, copy_function=shutil.copy2):
+        """复制任务文件到目标结构(copy_function负责单个文件)"""
         files_copied = 0
         
-        # 定义源目录到目标目录的映射
-        mappings = {
-            'parameters': f'parameters/{task_id}/{episode_id}',
-            'skeleton': f'skeletonData/{task_id}/{episode_id}',
-            'kinematic': f'kinematicData/{task_id}/{episode_id}',
-            'IMU': f'imu/{task_id}/{episode_id}',
-            'Tactile': f'tactileFeedback/{task_id}/{episode_id}',
-            'tactileFeedback': f'tactileFeedback/{task_id}/{episode_id}',
-            'tactile_feedback': f'tactile_feedback/{task_id}/{episode_id}',
-            'video': f'observations/{task_id}/{episode_id}/videos',
-            'object': f'object/{task_id}/{episode_id}'
-        }
-        
         # 复制各个目录
-        for source_dir, target_dir in mappings.items():
+        for source_dir, target_template in self._TASK_DIR_MAPPINGS.items():
+            target_dir = target_template.format(task_id=task_id, episode_id=episode_id)
             real_source_dir = self._find_subdir_case_insensitive(source_path, source_dir)
             if real_source_dir:
                 source_full_path = os.path.join(source_path, real_source_dir)
                 target_full_path = os.path.join(export_path, target_dir)
-                files_copied += self._copy_directory(source_full_path, target_full_path)
+                files_copied += self._copy_directory(source_full_path, target_full_path, copy_function)
         
         return files_copied
 
@@ -1251,74 +3617,40 @@ class ExportViewSet(viewsets.ViewSet):
         lookup = {e.lower(): e for e in entries}
         return lookup.get(name.lower())
     
-    def _copy_directory(self, source, target):
-        """复制目录及其内容"""
+    def _copy_directory(self, source, target, copy_function=shutil.copy2):
+        """复制目录及其内容，返回交给copy_function的文件数"""
         files_copied = 0
+        
+        def copy_and_count(src, dst):
+            nonlocal files_copied
+            copy_function(src, dst)
+            files_copied += 1
+            return dst
+        
         try:
             if os.path.isdir(source):
-                shutil.copytree(source, target, dirs_exist_ok=True)
-                # 计算复制的文件数量
-                for root, dirs, files in os.walk(target):
-                    files_copied += len(files)
+                shutil.copytree(source, target, dirs_exist_ok=True, copy_function=copy_and_count)
+        except ExportCancelled:
+            raise
         except Exception as e:
+            # 缺文件的导出不能标记为完成(增量导出还会把这些episode标记为已导出)
             print(f"复制目录失败 {source} -> {target}: {e}")
+            raise
         
         return files_copied
     
-    def _calculate_directory_size(self, directory_path):
-        """计算目录的总大小（字节）"""
-        total_size = 0
-        try:
-            for dirpath, dirnames, filenames in os.walk(directory_path):
-                for filename in filenames:
-                    file_path = os.path.join(dirpath, filename)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except (OSError, IOError):
-                        # 忽略无法访问的文件
-                        continue
-        except Exception as e:
-            print(f"[WARN] 计算目录大小失败: {e}")
-        return total_size
-    
-    def _get_file_statistics(self, directory_path):
-        """获取目录的文件统计信息"""
-        file_count = 0
-        directory_count = 0
-        file_types = {}
-        
-        try:
-            for dirpath, dirnames, filenames in os.walk(directory_path):
-                directory_count += len(dirnames)
-                for filename in filenames:
-                    file_count += 1
-                    # 统计文件类型
-                    file_ext = os.path.splitext(filename)[1].lower()
-                    if file_ext:
-                        file_types[file_ext] = file_types.get(file_ext, 0) + 1
-                    else:
-                        file_types['no_extension'] = file_types.get('no_extension', 0) + 1
-        except Exception as e:
-            print(f"[WARN] 获取文件统计信息失败: {e}")
-        
-        return {
-            "file_count": file_count,
-            "directory_count": directory_count,
-            "file_types": file_types
-        }
-    
-    def _create_task_catalog(self, export_path, task_dirs):
-        """创建task_catalog.json文件，包含导出统计信息"""
+    def _create_task_catalog(self, export_path, task_dirs, stats, mode='full', link_summary=None):
+        """创建task_catalog.json文件，包含导出统计信息(来自复制时累计的stats)"""
         catalog_path = os.path.join(export_path, 'task_catalog.json')
         try:
-            # 计算导出目录的总大小
-            total_size = self._calculate_directory_size(export_path)
+            # 导出的总大小
+            total_size = stats.total_bytes
             
             # 统计任务信息
             task_count = len(task_dirs)
             
             # 统计文件信息
-            file_stats = self._get_file_statistics(export_path)
+            file_stats = stats.file_statistics()
             
             catalog_data = {
                 "export_info": {
@@ -1326,6 +3658,8 @@ class ExportViewSet(viewsets.ViewSet):
                     "total_size_bytes": total_size,
                     "total_size_mb": round(total_size / (1024 * 1024), 2),
                     "total_size_gb": round(total_size / (1024 * 1024 * 1024), 3),
+                    "export_mode": mode,
+                    **(link_summary or {'link_mode': 'copy'}),
                     "task_count": task_count,
                     "file_count": file_stats["file_count"],
                     "directory_count": file_stats["directory_count"]
@@ -1350,49 +3684,104 @@ class ExportViewSet(viewsets.ViewSet):
             except:
                 pass
 
-    def _export_task_info_json(self, export_path):
+    # 逐行读取TaskInfo时每次从数据库取回的行数
+    _task_info_chunk_size = 2000
+    
+    def _iter_task_info_rows(self, task_pks, fields):
+        """按 task_id 分组的顺序逐行返回 TaskInfo，组内保持默认的 -created_at 顺序
+        全量导出直接用有序的 .iterator() 流式读取；指定 task_pks 时先只取排序键，
+        排好序后再按块取完整的行，内存中不保留整张表的数据。
+        """
+        order = ('task_id', '-created_at', '-pk')
+        if task_pks is None:
+            yield from TaskInfo.objects.exclude(task_id='').order_by(*order).only(*fields).iterator(
+                chunk_size=self._task_info_chunk_size)
+            return
+        
+        keys = []
+        for chunk in self._chunked(task_pks):
+            keys.extend(TaskInfo.objects.filter(pk__in=chunk).exclude(task_id='').values_list(
+                'task_id', 'created_at', 'pk'))
+        keys.sort(key=lambda k: (-k[1].timestamp(), -k[2]))
+        keys.sort(key=lambda k: k[0])
+        for chunk in self._chunked([pk for _, _, pk in keys]):
+            rows = TaskInfo.objects.only(*fields).in_bulk(chunk)
+            for pk in chunk:
+                if pk in rows:
+                    yield rows[pk]
+    
+    @staticmethod
+    def _task_info_item(it):
+        # episode_id 尽量转为 int，否则保留字符串
+        try:
+            ep_val = int(it.episode_id)
+        except Exception:
+            ep_val = str(it.episode_id)
+        return {
+            'episode_id': ep_val,
+            'label_info': {'action_config': it.action_config or []},
+            'task_name': it.task_name or '',
+            'init_scene_text': it.init_scene_text or ''
+        }
+    
+    def _export_task_info_json(self, export_path, task_pks=None):
         """将 TaskInfo 按业务 task_id 导出为 JSON 文件到 export_path/task_info 下。
         结构参照客户端 ExportManager._export_task_info_data：
         每个 task_id 一个 JSON 文件，数组元素包含 episode_id、label_info.action_config、task_name、init_scene_text。
+        task_pks 不为空时只导出这些 TaskInfo(增量导出)。
+        按 task_id 排序逐行读取，每组的数组元素边读边写入文件，内存占用与总episode数无关；
+        输出内容与 json.dump(..., indent=2) 相同。
         """
-        import json
-
         task_info_dir = os.path.join(export_path, 'task_info')
         os.makedirs(task_info_dir, exist_ok=True)
 
-        # 收集所有 TaskInfo，按 task_id 分组
-        all_tasks = list(TaskInfo.objects.all().only('task_id', 'episode_id', 'task_name', 'init_scene_text', 'action_config'))
-        task_id_to_items = {}
-        for it in all_tasks:
-            biz_id = str(it.task_id or '')
-            if not biz_id:
-                continue
-            task_id_to_items.setdefault(biz_id, []).append(it)
-
+        fields = ('task_id', 'episode_id', 'task_name', 'init_scene_text', 'action_config', 'created_at')
         exported_count = 0
-        for biz_id, items in task_id_to_items.items():
-            export_array = []
-            for it in items:
-                # episode_id 尽量转为 int，否则保留字符串
-                try:
-                    ep_val = int(it.episode_id)
-                except Exception:
-                    ep_val = str(it.episode_id)
-                export_array.append({
-                    'episode_id': ep_val,
-                    'label_info': {'action_config': it.action_config or []},
-                    'task_name': it.task_name or '',
-                    'init_scene_text': it.init_scene_text or ''
-                })
-
-            output_file = os.path.join(task_info_dir, f"{biz_id}.json")
+        current_id = None
+        output_file = None
+        f = None
+        
+        def finish_group():
+            nonlocal f, exported_count
+            if f is None:
+                return
             try:
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(export_array, f, ensure_ascii=False, indent=2)
+                f.write('\n]')
+                f.close()
                 exported_count += 1
             except Exception as e:
                 print(f"写入 task_info 文件失败 {output_file}: {e}")
-                continue
+            f = None
+        
+        try:
+            for it in self._iter_task_info_rows(task_pks, fields):
+                biz_id = str(it.task_id)
+                if biz_id != current_id:
+                    finish_group()
+                    current_id = biz_id
+                    output_file = os.path.join(task_info_dir, f"{biz_id}.json")
+                    try:
+                        f = open(output_file, 'w', encoding='utf-8')
+                        f.write('[')
+                    except Exception as e:
+                        print(f"写入 task_info 文件失败 {output_file}: {e}")
+                        f = None
+                    separator = '\n'
+                if f is None:
+                    continue
+                try:
+                    # 数组元素相对数组本身再缩进一级，与 indent=2 的整体输出一致
+                    item_json = json.dumps(self._task_info_item(it), ensure_ascii=False, indent=2)
+                    f.write(separator + '  ' + item_json.replace('\n', '\n  '))
+                    separator = ',\n'
+                except Exception as e:
+                    print(f"写入 task_info 文件失败 {output_file}: {e}")
+                    f.close()
+                    f = None
+            finish_group()
+        finally:
+            if f is not None:
+                f.close()
 
         return exported_count
     
@@ -1403,42 +3792,316 @@ class ExportViewSet(viewsets.ViewSet):
         if not export_id:
             return Response({'error': '缺少export_id参数'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if export_id not in ExportViewSet._active_exports:
+        record = JobStore.get(export_id, 'export')
+        if record is None:
             return Response({'error': '导出任务不存在'}, status=status.HTTP_404_NOT_FOUND)
         
-        task = ExportViewSet._active_exports[export_id]
         return Response({
-            'export_id': task['export_id'],
-            'status': task['status'],
-            'progress': task['progress'],
-            'message': task['message'],
-            'error_message': task['error_message'],
-            'created_at': task['created_at'].isoformat(),
-            'completed_at': task['completed_at'].isoformat() if task['completed_at'] else None,
-            'export_path': task['export_path'],
-            'file_count': task['file_count']
+            'export_id': record.job_id,
+            'status': record.status,
+            'priority': record.priority,
+            'progress': record.progress,
+            'message': record.message,
+            'error_message': record.error_message,
+            'created_at': JobStore.isoformat(record.created_at),
+            'completed_at': JobStore.isoformat(record.completed_at),
+            'export_path': record.result.get('export_path', ''),
+            'file_count': record.result.get('file_count', 0),
+            'mode': record.payload.get('mode', 'full'),
+            'episode_count': record.result.get('episode_count'),
+            'link_mode': record.payload.get('link_mode', 'copy'),
+            'link_stats': record.result.get('link_stats'),
+            'filters': record.payload.get('filters') or {},
+            'export_format': record.payload.get('export_format', 'directory'),
+            'shard_count': record.result.get('shard_count'),
+            'sample_count': record.result.get('sample_count'),
+            'metadata_format': record.result.get('metadata_format'),
+            'bytes_done': record.result.get('bytes_done'),
+            'bytes_total': record.result.get('bytes_total'),
+            'throughput_mbps': record.result.get('throughput_mbps'),
+            'avg_throughput_mbps': record.result.get('avg_throughput_mbps'),
+            'eta_seconds': record.result.get('eta_seconds')
+        })
+    
+    # 元数据表格式：parquet(需要pyarrow，未安装时退回csv) / csv / 空字符串(不生成)
+    _metadata_format = getattr(settings, 'EXPORT_METADATA_FORMAT', 'parquet')
+    _metadata_batch_size = 5000  # 每批读取并写出的episode数
+    # 各模态表 -> (列名前缀, 路径字段)；同一episode有多条记录时取最新一条
+    _METADATA_MODALITIES = (
+        (Observations, 'observations', ('video_path', 'depth_path')),
+        (Parameters, 'parameters', ('parameters_path',)),
+        (SkeletonData, 'skeleton', ('fbx_path', 'bvh_path', 'csv_path', 'npy_path')),
+        (KinematicData, 'kinematic', ('path',)),
+        (IMUData, 'imu', ('leftHandIMU_path', 'rightHandIMU_path')),
+        (TactileFeedback, 'tactile', ('leftHandTac_path', 'rightHandTac_path')),
+        (ObjectData, 'object', ('fbx_path', 'cmb_path')),
+    )
+    _METADATA_TIME_COLUMNS = ('created_at', 'updated_at', 'completed_at', 'recording_end_time', 'exported_at')
+    
+    @classmethod
+    def _metadata_columns(cls):
+        """元数据表的列：(列名, 类型)，类型为 string / int / timestamp"""
+        columns = [
+            ('id', 'int'), ('episode_id', 'string'), ('task_id', 'string'), ('task_name', 'string'),
+            ('task_name_cn', 'string'), ('task_status', 'string'), ('init_scene_text', 'string'),
+            ('action_config', 'string'), ('collector_id', 'string'), ('collector_name', 'string'),
+            ('collector_organization', 'string'), ('target_customer', 'string'),
+        ]
+        columns += [(name, 'timestamp') for name in cls._METADATA_TIME_COLUMNS]
+        for _, prefix, fields in cls._METADATA_MODALITIES:
+            columns += [(f"{prefix}_{field}", 'string') for field in fields]
+        return columns
+    
+    def _iter_metadata_batches(self, task_pks):
+        """按批返回元数据行；每批对各模态表各执行一次 task_info_id__in 查询"""
+        queryset = TaskInfo.objects.select_related('collector').order_by('pk')
+        if task_pks is None:
+            batches = self._batched(queryset.iterator(chunk_size=self._metadata_batch_size))
+        else:
+            batches = (list(queryset.filter(pk__in=chunk)) for chunk in self._chunked(sorted(task_pks)))
+        for tasks in batches:
+            modality_rows = {}
+            for model, prefix, fields in self._METADATA_MODALITIES:
+                latest = {}
+                for chunk in self._chunked([t.pk for t in tasks]):
+                    for row in model.objects.filter(task_info_id__in=chunk).order_by('pk').values(
+                            'task_info_id', *fields):
+                        latest[row['task_info_id']] = row
+                modality_rows[prefix] = latest
+            
+            rows = []
+            for task in tasks:
+                collector = task.collector
+                row = {
+                    'id': task.pk,
+                    'episode_id': task.episode_id,
+                    'task_id': task.task_id,
+                    'task_name': task.task_name,
+                    'task_name_cn': task.task_name_cn,
+                    'task_status': task.task_status,
+                    'init_scene_text': task.init_scene_text,
+                    # 结构不固定的动作配置以JSON字符串保存，可用DuckDB的json函数或json.loads展开
+                    'action_config': json.dumps(task.action_config or [], ensure_ascii=False),
+                    'collector_id': collector.collector_id,
+                    'collector_name': collector.collector_name,
+                    'collector_organization': collector.collector_organization,
+                    'target_customer': collector.target_customer,
+                }
+                for name in self._METADATA_TIME_COLUMNS:
+                    row[name] = getattr(task, name)
+                for _, prefix, fields in self._METADATA_MODALITIES:
+                    modality = modality_rows[prefix].get(task.pk, {})
+                    for field in fields:
+                        row[f"{prefix}_{field}"] = modality.get(field)
+                rows.append(row)
+            yield rows
+    
+    def _batched(self, iterable):
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) >= self._metadata_batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    def _export_metadata_table(self, export_path, task_pks=None):
+        """生成 metadata/episodes.parquet(或 .csv)：每个episode一行，
+        包含采集者、任务ID、状态、各时间戳、action_config 以及各模态表中记录的文件路径。
+        按批查询、按批写出(parquet每批一个row group)，内存占用与episode总数无关。
+        task_pks 不为空时只包含这些 TaskInfo，与 task_info JSON 保持一致。
+        """
+        metadata_format = self._metadata_format
+        if not metadata_format:
+            return {}
+        if metadata_format == 'parquet' and pyarrow is None:
+            print("[Export] 未安装pyarrow，元数据表改为CSV格式")
+            metadata_format = 'csv'
+        
+        metadata_dir = os.path.join(export_path, 'metadata')
+        os.makedirs(metadata_dir, exist_ok=True)
+        columns = self._metadata_columns()
+        output_file = os.path.join(metadata_dir, f"episodes.{metadata_format}")
+        row_count = 0
+        
+        if metadata_format == 'parquet':
+            types = {'string': pyarrow.string(), 'int': pyarrow.int64(),
+                     'timestamp': pyarrow.timestamp('us', tz='UTC')}
+            schema = pyarrow.schema([(name, types[kind]) for name, kind in columns])
+            with pyarrow_parquet.ParquetWriter(output_file, schema) as writer:
+                for rows in self._iter_metadata_batches(task_pks):
+                    writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+                    row_count += len(rows)
+        else:
+            with open(output_file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow([name for name, _ in columns])
+                for rows in self._iter_metadata_batches(task_pks):
+                    for row in rows:
+                        writer.writerow([
+                            row[name].isoformat() if kind == 'timestamp' and row[name] else row[name]
+                            for name, kind in columns
+                        ])
+                    row_count += len(rows)
+        
+        print(f"[Export] 写入元数据表: {output_file}, {row_count} 行")
+        return {'metadata_format': metadata_format, 'metadata_rows': row_count}
+    
+    # 导出目录中的校验清单文件名
+    _manifest_name = 'checksums.json'
+    
+    def _write_checksum_manifest(self, export_path, stats):
+        metadata_files = [os.path.join(export_path, 'task_catalog.json')]
+        for dir_name in ('task_info', 'metadata'):
+            dir_path = os.path.join(export_path, dir_name)
+            if os.path.isdir(dir_path):
+                metadata_files += [os.path.join(dir_path, name) for name in sorted(os.listdir(dir_path))]
+        for path in metadata_files:
+            if os.path.isfile(path):
+                stats.add_checksum(path, os.path.getsize(path), FileChecksum.of_file(path))
+        manifest = stats.write_manifest(os.path.join(export_path, self._manifest_name), FileChecksum.ALGORITHM)
+        print(f"[Export] 写入校验清单: {manifest['file_count']} 个文件, 算法: {manifest['algorithm']}")
+    
+    @action(detail=False, methods=['post'])
+    def verify(self, request):
+        """后台重新计算导出目录中各文件的校验和，与checksums.json比对"""
+        export_path = request.data.get('export_path')
+        if not export_path:
+            return Response({'error': '缺少export_path参数'}, status=status.HTTP_400_BAD_REQUEST)
+        real_path = self._resolve_export_path(export_path)
+        if real_path is None:
+            return Response({'error': '只能校验export_output下的导出目录'}, status=status.HTTP_403_FORBIDDEN)
+        if not os.path.isfile(os.path.join(real_path, self._manifest_name)):
+            return Response({'error': '导出目录中没有校验清单'}, status=status.HTTP_404_NOT_FOUND)
+        
+        verify_id = f"verify_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        JobStore.create(verify_id, 'verification', payload={'export_path': real_path}, message='等待校验')
+        JobStore.ensure_maintenance_started()
+        threading.Thread(target=self._run_verify, args=(verify_id,)).start()
+        return Response({'verify_id': verify_id, 'status': 'queued', 'export_path': real_path})
+    
+    def _run_verify(self, verify_id):
+        try:
+            record = JobStore.claim(verify_id, 'verifying')
+            if record is not None:
+                self._execute_verify(verify_id, record.payload['export_path'])
+        finally:
+            connection.close()
+    
+    @staticmethod
+    def _verify_file(file_path, rel_path, expected, algorithm):
+        """校验单个文件，一致时返回None，否则返回问题描述"""
+        try:
+            size = os.path.getsize(file_path)
+        except FileNotFoundError:
+            return {'path': rel_path, 'error': 'missing'}
+        if size != expected['size']:
+            return {'path': rel_path, 'error': 'size_mismatch', 'expected': expected['size'], 'actual': size}
+        digest = FileChecksum.of_file(file_path, algorithm)
+        if digest != expected['hash']:
+            return {'path': rel_path, 'error': 'hash_mismatch', 'expected': expected['hash'], 'actual': digest}
+        return None
+    
+    def _execute_verify(self, verify_id, export_path):
+        try:
+            with open(os.path.join(export_path, self._manifest_name), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            algorithm = manifest['algorithm']
+            FileChecksum.new(algorithm)
+            entries = manifest['files']
+            
+            problems = []
+            checked = 0
+            last_report = 0
+            pool = ThreadPoolExecutor(max_workers=max(1, self._export_workers), thread_name_prefix='export-verify')
+            try:
+                pending = {
+                    pool.submit(self._verify_file, os.path.join(export_path, *rel_path.split('/')), rel_path,
+                                expected, algorithm)
+                    for rel_path, expected in entries.items()
+                }
+                while pending:
+                    done, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        checked += 1
+                        problem = future.result()
+                        if problem:
+                            problems.append(problem)
+                    if time.time() - last_report >= 1:
+                        last_report = time.time()
+                        JobStore.update(verify_id, progress=int(checked / max(len(entries), 1) * 100),
+                                        message=f'已校验 {checked}/{len(entries)} 个文件')
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+            
+            # 清单中没有记录的文件
+            unexpected = [
+                rel_path for _, rel_path in self._iter_export_files(export_path, [])
+                if rel_path not in entries and rel_path != self._manifest_name
+            ]
+            problems.sort(key=lambda p: p['path'])
+            missing = sum(1 for p in problems if p['error'] == 'missing')
+            result = {
+                'ok': not problems and not unexpected,
+                'algorithm': algorithm,
+                'checked': checked,
+                'mismatch_count': len(problems) - missing,
+                'missing_count': missing,
+                'problems': problems[:1000],
+                'unexpected': unexpected[:1000]
+            }
+            message = (f'校验通过，共 {checked} 个文件' if result['ok'] else
+                       f'校验发现问题: 不一致 {result["mismatch_count"]} 个, 缺失 {missing} 个, 多余 {len(unexpected)} 个')
+            JobStore.update(verify_id, status='completed', progress=100, message=message, result=result)
+            print(f"[Export] {message}: {export_path}")
+        except Exception as e:
+            JobStore.update(verify_id, status='failed', error_message=str(e))
+            print(f"校验失败: {e}")
+    
+    @action(detail=False, methods=['get'])
+    def verify_status(self, request):
+        """查询校验任务状态与结果"""
+        verify_id = request.query_params.get('verify_id')
+        if not verify_id:
+            return Response({'error': '缺少verify_id参数'}, status=status.HTTP_400_BAD_REQUEST)
+        record = JobStore.get(verify_id, 'verification')
+        if record is None:
+            return Response({'error': '校验任务不存在'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'verify_id': record.job_id,
+            'status': record.status,
+            'progress': record.progress,
+            'message': record.message,
+            'error_message': record.error_message,
+            'export_path': record.payload.get('export_path', ''),
+            'created_at': JobStore.isoformat(record.created_at),
+            'completed_at': JobStore.isoformat(record.completed_at),
+            **record.result
         })
     
     @action(detail=False, methods=['get'], url_path='list')
     def list_exports(self, request):
         """列出所有导出任务"""
         tasks = []
-        for task in ExportViewSet._active_exports.values():
+        records = JobRecord.objects.filter(kind='export').order_by('-created_at')
+        for record in records:
             tasks.append({
-                'export_id': task['export_id'],
-                'status': task['status'],
-                'progress': task['progress'],
-                'message': task['message'],
-                'created_at': task['created_at'].isoformat(),
-                'completed_at': task['completed_at'].isoformat() if task['completed_at'] else None,
-                'file_count': task['file_count']
+                'export_id': record.job_id,
+                'status': record.status,
+                'priority': record.priority,
+                'progress': record.progress,
+                'message': record.message,
+                'created_at': JobStore.isoformat(record.created_at),
+                'completed_at': JobStore.isoformat(record.completed_at),
+                'file_count': record.result.get('file_count', 0)
             })
         
         return Response({
             'exports': tasks,
             'total': len(tasks),
-            'running': ExportViewSet._running_exports,
-            'queued': len(ExportViewSet._export_queue)
+            'running': sum(1 for t in tasks if t['status'] in JobStore.RUNNING_STATUSES['export']),
+            'queued': sum(1 for t in tasks if t['status'] == 'queued')
         })
     
     @action(detail=False, methods=['get'], url_path='download_export')
@@ -1483,40 +4146,253 @@ class ExportViewSet(viewsets.ViewSet):
             print(f"[DEBUG] 扫描文件失败: {e}")
             return Response({'error': f'扫描文件失败: {e}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    # 打包下载时每次从文件读取的块大小
+    _archive_read_size = 1024 * 1024
+    
+    @staticmethod
+    def _resolve_export_path(export_path):
+        """把请求中的导出路径解析为export_output下的真实路径，不在其中时返回None"""
+        export_root = os.path.realpath(os.path.join(settings.BASE_DIR, 'export_output'))
+        real_path = os.path.realpath(export_path)
+        if os.path.commonpath([export_root, real_path]) != export_root or real_path == export_root:
+            return None
+        return real_path
+    
+    @staticmethod
+    def _iter_export_files(export_path, prefixes):
+        """按路径顺序遍历导出目录，返回(绝对路径, 相对路径)；prefixes非空时只保留其下的文件"""
+        for root, dirs, filenames in os.walk(export_path):
+            dirs.sort()
+            for filename in sorted(filenames):
+                file_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(file_path, export_path).replace(os.sep, '/')
+                if prefixes and not any(rel_path == p or rel_path.startswith(p + '/') for p in prefixes):
+                    continue
+                yield file_path, rel_path
+    
+    def _stream_zip(self, files):
+        """边读文件边生成ZIP数据(STORED，数据多为已压缩的视频/npy)，内存占用与文件大小无关"""
+        buffer = ArchiveStreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED, allowZip64=True) as zipf:
+            for file_path, rel_path in files:
+                zinfo = zipfile.ZipInfo.from_file(file_path, rel_path)
+                with open(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dst:
+                    while True:
+                        chunk = src.read(self._archive_read_size)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                        if buffer.size >= self._archive_read_size:
+                            yield buffer.drain()
+                yield buffer.drain()
+        # 中央目录在关闭时写入
+        yield buffer.drain()
+    
+    def _stream_tar(self, files):
+        """边读文件边生成tar数据：逐个输出成员头和按512字节补齐的文件内容"""
+        written = 0
+        for file_path, rel_path in files:
+            st = os.stat(file_path)
+            tarinfo = tarfile.TarInfo(rel_path)
+            tarinfo.size = st.st_size
+            tarinfo.mtime = int(st.st_mtime)
+            tarinfo.mode = 0o644
+            header = tarinfo.tobuf(format=tarfile.PAX_FORMAT)
+            yield header
+            remaining = st.st_size
+            with open(file_path, 'rb') as src:
+                while remaining > 0:
+                    chunk = src.read(min(self._archive_read_size, remaining))
+                    if not chunk:
+                        raise IOError(f'文件在打包过程中被截断: {file_path}')
+                    remaining -= len(chunk)
+                    yield chunk
+            padding = -st.st_size % tarfile.BLOCKSIZE
+            if padding:
+                yield tarfile.NUL * padding
+            written += len(header) + st.st_size + padding
+        # 结尾两个空块，并补齐到tar记录大小
+        end = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+        written += len(end)
+        yield end + tarfile.NUL * (-written % tarfile.RECORDSIZE)
+    
+    @action(detail=False, methods=['get'], url_path='download_archive')
+    def download_archive(self, request):
+        """把整个导出目录(或其中prefix指定的部分)打包成一个zip/tar流式下载，不生成临时文件
+        参数: export_path, archive_format=zip(默认)/tar, prefix=相对路径(可多个，逗号分隔)
+        (不用format作参数名：DRF把它当作响应格式后缀)
+        """
+        export_path = request.query_params.get('export_path')
+        archive_format = request.query_params.get('archive_format', 'zip')
+        if not export_path:
+            return Response({'error': '缺少export_path参数'}, status=status.HTTP_400_BAD_REQUEST)
+        if archive_format not in ('zip', 'tar'):
+            return Response({'error': f'不支持的打包格式: {archive_format}'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        real_path = self._resolve_export_path(export_path)
+        if real_path is None:
+            return Response({'error': '只能下载export_output下的导出目录'}, status=status.HTTP_403_FORBIDDEN)
+        if not os.path.isdir(real_path):
+            return Response({'error': f'导出路径不存在: {export_path}'}, status=status.HTTP_404_NOT_FOUND)
+        
+        prefixes = [
+            p.strip().replace('\\', '/').strip('/')
+            for value in request.query_params.getlist('prefix')
+            for p in value.split(',') if p.strip()
+        ]
+        files = self._iter_export_files(real_path, prefixes)
+        if archive_format == 'zip':
+            response = StreamingHttpResponse(self._stream_zip(files), content_type='application/zip')
+        else:
+            response = StreamingHttpResponse(self._stream_tar(files), content_type='application/x-tar')
+        archive_name = f"{os.path.basename(real_path)}.{archive_format}"
+        response['Content-Disposition'] = f'attachment; filename="{archive_name}"'
+        print(f"[DEBUG] 打包下载: {real_path}, 格式: {archive_format}, 前缀: {prefixes or '全部'}")
+        return response
+    
+    # 文件下载卸载给前端服务器：''(由Django返回) / 'x-accel'(nginx X-Accel-Redirect) / 'x-sendfile'(Apache/lighttpd)
+    _sendfile_mode = getattr(settings, 'EXPORT_SENDFILE_MODE', '')
+    # x-accel模式下export_output在nginx中对应的internal location前缀
+    _sendfile_prefix = getattr(settings, 'EXPORT_SENDFILE_PREFIX', '/protected/export_output/')
+    
+    @staticmethod
+    def _guess_content_type(file_path):
+        # 获取文件扩展名
+        _, ext = os.path.splitext(file_path)
+        content_type = 'application/octet-stream'
+        if ext.lower() in ['.json']:
+            content_type = 'application/json'
+        elif ext.lower() in ['.mp4', '.avi', '.mov']:
+            content_type = 'video/mp4'
+        elif ext.lower() in ['.txt']:
+            content_type = 'text/plain'
+        elif ext.lower() in ['.csv']:
+            content_type = 'text/csv'
+        return content_type
+    
+    @staticmethod
+    def _parse_range(range_header, size):
+        """解析单个字节区间 bytes=start-end / bytes=start- / bytes=-suffix
+        返回(start, end)；无法解析或多区间时返回None(按完整文件返回)；区间不可满足时抛出ValueError
+        """
+        match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', range_header or '')
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        if not match.group(1):
+            suffix = int(match.group(2))
+            if suffix == 0 or size == 0:
+                raise ValueError('unsatisfiable')
+            return max(0, size - suffix), size - 1
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        if match.group(2) and end < start:
+            return None
+        if start >= size:
+            raise ValueError('unsatisfiable')
+        return start, min(end, size - 1)
+    
+    @staticmethod
+    def _if_range_matches(if_range, etag, mtime):
+        """If-Range为ETag时需强匹配，为日期时需与文件修改时间一致"""
+        if not if_range:
+            return True
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            return if_range == etag
+        return parse_http_date_safe(if_range) == mtime
+    
+    @staticmethod
+    def _not_modified(request, etag, mtime):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            return '*' in tags or etag in tags or f'W/{etag}' in tags
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+        return if_modified_since is not None and mtime <= if_modified_since
+    
+    def _sendfile_response(self, full_path, content_type):
+        """把文件发送交给前端服务器(nginx/Apache)，Range等由前端服务器处理"""
+        response = HttpResponse(content_type=content_type)
+        if self._sendfile_mode == 'x-accel':
+            export_root = os.path.realpath(os.path.join(settings.BASE_DIR, 'export_output'))
+            rel_path = os.path.relpath(full_path, export_root).replace(os.sep, '/')
+            response['X-Accel-Redirect'] = quote(self._sendfile_prefix.rstrip('/') + '/' + rel_path)
+        else:
+            response['X-Sendfile'] = full_path
+        return response
+    
     @action(detail=False, methods=['get'], url_path='download_file')
     def download_file(self, request):
-        """下载单个文件"""
+        """下载单个文件
+        支持 Range/If-Range 断点续传(单区间)，返回 ETag/Last-Modified 并处理条件请求；
+        文件不读入内存，可配置EXPORT_SENDFILE_MODE交给前端服务器发送。
+        """
         export_path = request.query_params.get('export_path')
         file_path = request.query_params.get('file_path')
         
         if not export_path or not file_path:
             return JsonResponse({'error': '缺少参数'}, status=400)
         
-        # 构建完整文件路径
-        full_path = os.path.join(export_path, file_path)
+        # 构建完整文件路径，且必须位于export_output下的导出目录中
+        real_export_path = self._resolve_export_path(export_path)
+        full_path = os.path.realpath(os.path.join(real_export_path or export_path, file_path))
+        if real_export_path is None or os.path.commonpath([real_export_path, full_path]) != real_export_path:
+            return JsonResponse({'error': '只能下载export_output下的导出文件'}, status=403)
         
-        if not os.path.exists(full_path):
+        if not os.path.isfile(full_path):
             return JsonResponse({'error': '文件不存在'}, status=404)
         
         try:
-            with open(full_path, 'rb') as f:
-                content = f.read()
-            
-            # 获取文件扩展名
-            _, ext = os.path.splitext(file_path)
-            content_type = 'application/octet-stream'
-            if ext.lower() in ['.json']:
-                content_type = 'application/json'
-            elif ext.lower() in ['.mp4', '.avi', '.mov']:
-                content_type = 'video/mp4'
-            elif ext.lower() in ['.txt']:
-                content_type = 'text/plain'
-            elif ext.lower() in ['.csv']:
-                content_type = 'text/csv'
-            
-            response = HttpResponse(content, content_type=content_type)
-            response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
+            content_type = self._guess_content_type(file_path)
+            disposition = f'attachment; filename="{os.path.basename(file_path)}"'
+            if self._sendfile_mode in ('x-accel', 'x-sendfile'):
+                response = self._sendfile_response(full_path, content_type)
+                response['Content-Disposition'] = disposition
+                return response
+            
+            st = os.stat(full_path)
+            size = st.st_size
+            mtime = int(st.st_mtime)
+            etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+            validators = {'ETag': etag, 'Last-Modified': http_date(mtime), 'Accept-Ranges': 'bytes'}
+            
+            if self._not_modified(request, etag, mtime):
+                response = HttpResponse(status=304)
+                for key, value in validators.items():
+                    response[key] = value
+                return response
+            
+            byte_range = None
+            range_header = request.headers.get('Range')
+            if range_header and self._if_range_matches(request.headers.get('If-Range'), etag, mtime):
+                try:
+                    byte_range = self._parse_range(range_header, size)
+                except ValueError:
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = f'bytes */{size}'
+                    response['Accept-Ranges'] = 'bytes'
+                    return response
+            
+            f = open(full_path, 'rb')
+            if byte_range is None:
+                response = FileResponse(f, content_type=content_type)
+                response['Content-Length'] = str(size)
+            else:
+                start, end = byte_range
+                response = FileResponse(RangeFileWrapper(f, start, end - start + 1),
+                                        status=206, content_type=content_type)
+                response['Content-Length'] = str(end - start + 1)
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            for key, value in validators.items():
+                response[key] = value
+            response['Content-Disposition'] = disposition
             return response
             
         except Exception as e:
             return JsonResponse({'error': f'文件读取失败: {str(e)}'}, status=500)
+
+
+# fork出的子进程(如gunicorn --preload)只继承调用fork的线程，需要重置各类在本进程中的调度状态
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=JobStore._reset_after_fork)
+    os.register_at_fork(after_in_child=FileUploadViewSet._reset_after_fork)
+    os.register_at_fork(after_in_child=ExportViewSet._reset_after_fork)
@@ -151,6 +151,42 @@ FILE_UPLOAD_DIR = BASE_DIR / "uploads"
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
 FILE_UPLOAD_PERMISSIONS = 0o644
+# 上传文件直写磁盘时每次读取/写入的块大小
+UPLOAD_WRITE_CHUNK_SIZE = 4 * 1024 * 1024
+
+# 解压工作线程数（同时进行的解压任务上限）
+EXTRACTION_MAX_CONCURRENT = 2
+# 并行解压进程数（0 表示使用CPU核数），解压后总大小低于阈值的压缩包仍单线程解压
+EXTRACTION_PROCESS_WORKERS = 0
+EXTRACTION_PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+# 后台任务(解压/导出)状态保存在数据库中，多个工作进程共享：
+# 工作进程按心跳间隔刷新所持任务的心跳，心跳超过租约时长的任务视为其进程已退出并被回收
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_LEASE_SECONDS = 300
+
+# 上传准入控制：超过排队上限或待处理字节上限时返回429，剩余磁盘低于水位时返回503
+UPLOAD_MAX_QUEUE_DEPTH = 50
+UPLOAD_MAX_PENDING_BYTES = 100 * 1024 * 1024 * 1024
+UPLOAD_MIN_FREE_BYTES = 10 * 1024 * 1024 * 1024
+# 拒绝时建议客户端的重试间隔(秒)
+UPLOAD_RETRY_AFTER = 30
+# 容量预留的有效期(秒)，过期未使用的预留不再占用容量
+UPLOAD_RESERVATION_TTL = 600
+
+# 同时执行的导出任务上限(所有工作进程合计)，其余导出任务按优先级排队
+EXPORT_MAX_CONCURRENT = 2
+# 单个导出任务的复制线程数；超过EXPORT_LARGE_FILE_BYTES的文件单独提交给线程池复制
+EXPORT_MAX_WORKERS = 8
+EXPORT_LARGE_FILE_BYTES = 64 * 1024 * 1024
+# 导出文件下载交给前端服务器发送：''(Django直接返回) / 'x-accel'(nginx) / 'x-sendfile'(Apache/lighttpd)
+EXPORT_SENDFILE_MODE = ''
+# x-accel模式下export_output对应的nginx internal location
+EXPORT_SENDFILE_PREFIX = '/protected/export_output/'
+# WebDataset格式导出的tar分片大小
+EXPORT_SHARD_SIZE = 1024 * 1024 * 1024
+# 导出时生成的列式元数据表(metadata/episodes.*)：'parquet'(需要pyarrow，未安装时退回csv) / 'csv' / ''(不生成)
+EXPORT_METADATA_FORMAT = 'parquet'
 
 # 确保上传目录存在
 FILE_UPLOAD_DIR.mkdir(exist_ok=True)